@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import os
+import zipfile
+import hashlib
+import contextlib
+
+#
+# ROMs inside zip archives, read straight out of the archive without extracting anything to disk.
+#
+# A ROM in an archive is named "archive.zip!member.rom", and anything taking ROM filenames (washes, the fingerprint
+# cache, identification, copies into the repository) can be handed one of those instead of a plain filename.
+#
+
+member_separator = '!'
+
+read_buffer_size = 1024 * 1024
+
+
+def split_member_name(name):
+    # (archive, member) for an "archive.zip!member" name, None for a plain filename
+    idx = name.lower().find(f".zip{member_separator}")
+    if idx < 0:
+        return None
+
+    zip_path = name[:idx + 4]
+    if os.path.isfile(zip_path) is False:
+        return None
+    return (zip_path, name[idx + 5:])
+
+
+def is_archive(filename):
+    return filename.lower().endswith('.zip') and os.path.isfile(filename) and zipfile.is_zipfile(filename)
+
+
+def rom_members(zip_path, extensions=None):
+    # the members of an archive with one of the (upper case, no dot) extensions, in archive order
+    members = []
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            if extensions is not None and os.path.splitext(info.filename)[1][1:].upper() not in extensions:
+                continue
+            members.append(info.filename)
+    return members
+
+
+def expand_archives(filenames, extensions=None):
+    # generator replacing each zip archive in filenames with its ROM members' names
+    for filename in filenames:
+        if is_archive(filename):
+            for member in rom_members(filename, extensions):
+                yield f"{filename}{member_separator}{member}"
+        else:
+            yield filename
+    return
+
+
+def rom_file_exists(name):
+    parts = split_member_name(name)
+    if parts is None:
+        return os.path.isfile(name)
+
+    with zipfile.ZipFile(parts[0]) as zf:
+        try:
+            zf.getinfo(parts[1])
+        except KeyError:
+            return False
+    return True
+
+
+def source_stat(name):
+    # os.stat of the file a ROM's bytes come from (the archive, for a member)
+    parts = split_member_name(name)
+    return os.stat(name if parts is None else parts[0])
+
+
+@contextlib.contextmanager
+def open_rom_file(name):
+    # a binary file object reading the ROM's bytes, streamed out of the archive for a member
+    parts = split_member_name(name)
+    if parts is None:
+        with open(name, 'rb') as fh:
+            yield fh
+        return
+
+    with zipfile.ZipFile(parts[0]) as zf, zf.open(parts[1]) as fh:
+        yield fh
+    return
+
+
+def read_rom_file(name):
+    with open_rom_file(name) as fh:
+        return fh.read()
+
+
+def file_sha1(name):
+    # the SHA1 of a ROM's bytes (a wash's file_sha1), streamed so big files are never read in whole
+    m = hashlib.sha1()
+    with open_rom_file(name) as fh:
+        for chunk in iter(lambda: fh.read(read_buffer_size), b''):
+            m.update(chunk)
+    return m.hexdigest()
@@ -1,18 +1,93 @@
 #!/usr/bin/python
 
 import os
+import mmap
+import struct
+import collections
 
+# every CC3 menu entry is 32 bytes: a 20 character description, an 8 character file name (no extension) and a 4
+# character menu name, all space padded
+cc3_record = struct.Struct('20s8s4s')
 
-def get_entries_and_filenames_from_cc3_file(filename):
+
+def cc3_field(value, width):
+    return value.encode('latin-1', errors='replace')[:width].ljust(width)
+
+
+def pack_cc3_entries(entries):
+    # entries are (description, file, menu) strings, each gets padded (or cut) to its field
+    buf = bytearray(cc3_record.size * len(entries))
+    for i, (desc, fname, menu) in enumerate(entries):
+        cc3_record.pack_into(buf, i * cc3_record.size, cc3_field(desc, 20), cc3_field(fname, 8), cc3_field(menu, 4))
+    return bytes(buf)
+
+
+class Cc3Entry(collections.namedtuple('Cc3Entry', ['desc', 'file', 'menu'])):
+    # one decoded menu entry, fields stripped of their padding.  A blank menu means file is a game, otherwise file
+    # is the menu being linked to.
+    __slots__ = ()
+
+    def is_game(self):
+        return self.menu == ''
+
+
+def iter_cc3_records(data):
+    # generator decoding packed CC3 data (bytes, mmap, anything with the buffer protocol) one entry at a time.  A
+    # short record at the end is ignored.
+    n = len(data) - len(data) % cc3_record.size
+    with memoryview(data) as view, view[:n] as records:
+        for entry, file8, menu in cc3_record.iter_unpack(records):
+            yield Cc3Entry(entry.decode('latin-1').strip(), file8.decode('latin-1').strip(),
+                           menu.decode('latin-1').strip())
+    return
+
+
+def decode_cc3_data(data):
+    return list(iter_cc3_records(data))
+
+
+def verify_cc3_data(data, entries):
+    # make sure the packed data reads back as the entries it was made from
+    decoded = decode_cc3_data(data)
+    if len(decoded) != len(entries):
+        raise Exception(f"CC3 data has {len(decoded)} entries, expected {len(entries)}")
+
+    for rec, (desc, fname, menu) in zip(decoded, entries):
+        expected = (cc3_field(desc, 20).decode('latin-1').strip(), cc3_field(fname, 8).decode('latin-1').strip(),
+                    cc3_field(menu, 4).decode('latin-1').strip())
+        if tuple(rec) != expected:
+            raise Exception(f"CC3 entry {str(tuple(rec))} doesn't match {str(expected)}")
+    return
+
+
+def iter_cc3_file(filename):
+    #
+    # Generator yielding a Cc3Entry for each record in a CC3 menu file.  The file is mapped rather than read, and
+    # entries are only decoded as they're asked for.
+    #
     if not os.path.isfile(filename):
-        raise Exception("%s doesn't seem to be a file." % filename)
+        raise Exception(f"{filename} doesn't seem to be a file.")
 
-    ccdata = get_cc3_data(filename)
-    output = dict()
+    with open(filename, 'rb') as fh:
+        if os.fstat(fh.fileno()).st_size < cc3_record.size:
+            return
+        data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    records = iter_cc3_records(data)
+    try:
+        yield from records
+    finally:
+        # the decoder has to let go of the map before it can be closed
+        records.close()
+        data.close()
+    return
 
-    for datum in ccdata:
-        if datum['menu'] == '    ':
-            output[datum['file']] = datum['desc']
+
+def get_entries_and_filenames_from_cc3_file(filename):
+    output = dict()
+    for rec in iter_cc3_file(filename):
+        if rec.is_game():
+            output[rec.file] = rec.desc
     return output
 
 
@@ -30,25 +105,48 @@ def get_menufile_data(filename):
 
 
 def get_cc3_data(filename):
-    if not os.path.isfile(filename):
-        raise Exception("%s doesn't seem to be a file." % filename)
-
-    output = list()
-
-    with open(filename, 'rb') as fh:
-        while True:
-            # 32 byte records
-            entry = fh.read(20)
-            file8 = fh.read(8)
-            menu = fh.read(4)
-
-            if entry == '':
-                break
-
-            rec = dict()
-            rec['desc'] = entry.strip()
-            rec['file'] = file8.strip()
-            rec['menu'] = menu.strip()
-
-            output.append(rec)
-    return output
+    return list(iter_cc3_file(filename))
+
+
+def scan_cc3_tree(top):
+    #
+    # Read every CC3 menu file under top (an SD card, or a copy of one) in one go.  Returns a dict of menu name to
+    # its list of Cc3Entry.  Menus are named by their path relative to top with the .CC3 dropped and the name upper
+    # cased, so the menus at the top of the card are just MENU, GAME, ...
+    #
+    index = dict()
+    for dirpath, dirnames, filenames in os.walk(top):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            base, ext = os.path.splitext(filename)
+            if ext.upper() != '.CC3':
+                continue
+
+            menu_dir = os.path.relpath(dirpath, top)
+            menu = base.upper() if menu_dir == '.' else os.path.join(menu_dir, base.upper())
+            index[menu] = get_cc3_data(os.path.join(dirpath, filename))
+    return index
+
+
+def audit_cc3_tree(top, index=None):
+    #
+    # Generator yielding (menu, entry, problem) for menu entries on a card that lead nowhere: links to menus that
+    # don't exist and games with no file of that name next to the menu.
+    #
+    if index is None:
+        index = scan_cc3_tree(top)
+
+    dir_files = dict()
+    for menu, entries in index.items():
+        menu_dir = os.path.dirname(menu)
+        if menu_dir not in dir_files:
+            with os.scandir(os.path.join(top, menu_dir)) as it:
+                dir_files[menu_dir] = set(os.path.splitext(e.name)[0].upper() for e in it if e.is_file())
+
+        for rec in entries:
+            if rec.is_game():
+                if rec.file.upper() not in dir_files[menu_dir]:
+                    yield (menu, rec, f"no file {rec.file} for this game")
+            elif os.path.join(menu_dir, rec.file.upper()) not in index:
+                yield (menu, rec, f"links to missing menu {rec.file}")
+    return
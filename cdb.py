@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+#
+# Reader and writer for constant databases in D. J. Bernstein's cdb format (https://cr.yp.to/cdb/cdb.txt).
+#
+# A cdb is written once and then only read.  Lookups hash the key and go straight to a slot, so finding a game's
+# options is a couple of reads from an mmap however big the file is, with nothing to parse up front.
+#
+# This module only uses the standard library and doesn't import anything else from the tool, so it can be copied
+# onto the Pi on its own:
+#
+#     $ python3 cdb.py game_opts.cdb ASTRO.ROM
+#     voice=0 ecs=0 jlp=0 tutorvision=0 kbdhackfile=basic cfg=
+#
+# Layout: a 2048 byte header of 256 (position, slot count) pairs, one per hash table, then the records
+# (key length, data length, key, data), then the 256 hash tables of (hash, record position) slots.  All numbers are
+# little endian 32 bit unsigned ints.
+#
+
+import os
+import sys
+import mmap
+import struct
+
+header_size = 2048
+
+
+def cdb_hash(key):
+    h = 5381
+    for c in key:
+        h = ((h << 5) + h) ^ c
+        h &= 0xFFFFFFFF
+    return h
+
+
+class CdbWriter:
+    # Builds a cdb in a temp file next to the target, which is renamed into place by finish()
+    def __init__(self, filename):
+        self.filename = filename
+        self.temp_file = f"{filename}.tmp.{os.getpid()}"
+        self.fh = open(self.temp_file, 'wb')
+        self.fh.write(b'\0' * header_size)
+        self.pos = header_size
+        self.slots = [[] for i in range(0, 256)]
+        return
+
+    def add(self, key, data):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        h = cdb_hash(key)
+        self.slots[h & 0xFF].append((h, self.pos))
+        self.fh.write(struct.pack('<II', len(key), len(data)))
+        self.fh.write(key)
+        self.fh.write(data)
+        self.pos += 8 + len(key) + len(data)
+        return
+
+    def finish(self):
+        header = []
+        for slots in self.slots:
+            # twice as many slots as entries, each entry starting at its hash's slot and taking the next free one
+            nslots = len(slots) * 2
+            table = [(0, 0)] * nslots
+            for h, pos in slots:
+                i = (h >> 8) % nslots
+                while table[i][1] != 0:
+                    i = (i + 1) % nslots
+                table[i] = (h, pos)
+
+            header.append((self.pos, nslots))
+            for h, pos in table:
+                self.fh.write(struct.pack('<II', h, pos))
+            self.pos += 8 * nslots
+
+        if self.pos > 0xFFFFFFFF:
+            self.abort()
+            raise Exception("cdb files can't be bigger than 4GB")
+
+        self.fh.seek(0)
+        for pos, nslots in header:
+            self.fh.write(struct.pack('<II', pos, nslots))
+
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+        self.fh.close()
+        os.replace(self.temp_file, self.filename)
+        return
+
+    def abort(self):
+        self.fh.close()
+        if os.path.isfile(self.temp_file):
+            os.remove(self.temp_file)
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.finish()
+        else:
+            self.abort()
+        return False
+
+
+class CdbReader:
+    def __init__(self, filename):
+        with open(filename, 'rb') as fh:
+            self.map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return
+
+    def close(self):
+        self.map.close()
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def get(self, key, default=None):
+        # returns the data (as bytes) for the first record with this key
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+
+        h = cdb_hash(key)
+        table_pos, nslots = struct.unpack_from('<II', self.map, (h & 0xFF) * 8)
+        if nslots == 0:
+            return default
+
+        i = (h >> 8) % nslots
+        for n in range(0, nslots):
+            slot_hash, rec_pos = struct.unpack_from('<II', self.map, table_pos + 8 * i)
+            if rec_pos == 0:
+                break
+
+            if slot_hash == h:
+                klen, dlen = struct.unpack_from('<II', self.map, rec_pos)
+                if self.map[rec_pos + 8:rec_pos + 8 + klen] == key:
+                    start = rec_pos + 8 + klen
+                    return self.map[start:start + dlen]
+            i = (i + 1) % nslots
+        return default
+
+    def __getitem__(self, key):
+        data = self.get(key)
+        if data is None:
+            raise KeyError(key)
+        return data
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+#
+# Game options for the emulator, one record per ROM keyed by the upper case ROM filename.  The data is the values
+# of game_opts_fields joined by tabs, flags as 1 or 0.  The cfg field is the name of the ROM's .CFG file when it has
+# one, and the cfg file's contents are stored under that name as well.
+#
+
+game_opts_fields = ('voice', 'ecs', 'jlp', 'tutorvision', 'kbdhackfile', 'cfg')
+game_opts_flags = ('voice', 'ecs', 'jlp', 'tutorvision')
+
+
+def encode_game_opts(opts):
+    values = []
+    for k in game_opts_fields:
+        if k in game_opts_flags:
+            values.append('1' if opts.get(k) is True else '0')
+        else:
+            values.append(opts.get(k) or '')
+    return '\t'.join(values)
+
+
+def decode_game_opts(data):
+    opts = {}
+    for k, v in zip(game_opts_fields, data.decode('utf-8').split('\t')):
+        if k in game_opts_flags:
+            opts[k] = v == '1'
+        else:
+            opts[k] = v if v != '' else None
+    return opts
+
+
+def get_game_opts(reader, romfile):
+    data = reader.get(romfile.upper())
+    if data is None:
+        return None
+    return decode_game_opts(data)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"usage: {sys.argv[0]} <cdb file> <ROM filename>")
+        sys.exit(2)
+
+    with CdbReader(sys.argv[1]) as reader:
+        opts = get_game_opts(reader, sys.argv[2])
+
+    if opts is None:
+        sys.exit(1)
+
+    print(' '.join(map(lambda k: f"{k}={int(opts[k]) if k in game_opts_flags else (opts[k] or '')}",
+                       game_opts_fields)))
@@ -1,11 +1,16 @@
 #!/usr/bin/python
 
 import hashlib
-import struct
+import zlib
 
 
 def cowering_crc32_from_file(filename):
-    return call_crc_func_for_file(filename, 'cowering_crc32')
+    # Cowering's CRC is plain IEEE CRC32, so stream the file through zlib rather than going byte by byte
+    crc = 0
+    with open(filename, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
 
 
 def crc32_from_file(filename):
@@ -25,12 +30,8 @@ def dow_crc8_from_file(filename):
 
 
 def call_crc_func_for_file(filename, funcname):
-    uint_8s = list()
     with open(filename, 'rb') as fh:
-        ch = fh.read(1)
-        while ch != b'':
-            uint_8s.append(struct.unpack('B', ch)[0])
-            ch = fh.read(1)
+        uint_8s = list(fh.read())
 
     function_map = {'cowering_crc32': cowering_crc32,
                     'crc32': crc32,
@@ -46,23 +47,10 @@ def call_crc_func_for_file(filename, funcname):
 
 
 def cowering_crc32(uint_8s, start=0, length=None):
-    crc_table = []
-    for i in range(256):
-        k = i
-        for j in range(8):
-            if k & 1:
-                k ^= 0x1db710640
-            k >>= 1
-        crc_table.append(k)
-
-    crc = 0xFFFFFFFF
-
+    # table driven CRC32 with the reflected IEEE polynomial, which is exactly what zlib computes
     if length is None:
         length = len(uint_8s)
-
-    for i in range(start, start + length):
-        crc = (crc >> 8) ^ crc_table[(crc & 0xFF) ^ uint_8s[i]]
-    return crc ^ 0xFFFFFFFF
+    return zlib.crc32(bytes(uint_8s[start:start + length]))
 
 
 def crc32(uint_8s, start=0, length=None):
@@ -203,24 +191,12 @@ def ieee_crc32(uint_8s, start=0, length=None):
     # 0x00 0x00 0x00 0x00 0x00 0x00 0x00 0x00               0x6522DF69
     # 0xFF 0xFF 0xFF 0xFF 0xFF 0xFF 0xFF 0xFF               0x2144DF1C
 
-    crc = 0xFFFFFFFF
-    crc_const = 0xEDB88320
+    #
+    # This is the same CRC zlib computes, so let zlib do it.
 
     if length is None:
         length = len(uint_8s)
-
-    for i in range(start, start + length):
-        crc ^= uint_8s[i]
-        crc &= 0xFFFFFFFF
-        for j in range(0, 8):
-            bitval = 0
-            if (crc & 0x01) == 1:
-                bitval = crc_const
-            crc = (crc >> 1) ^ bitval
-            crc &= 0xFFFFFFFF
-
-    crc ^= 0xFFFFFFFF
-    return crc
+    return zlib.crc32(bytes(uint_8s[start:start + length]))
 
 
 def dow_crc8(uint_8s, start=0, length=None):
@@ -1,42 +1,172 @@
 #!/usr/bin/python
 
+import os
 import re
+import json
 
+# a clrmamepro DAT is a stream of bare words, quoted strings and parens - eg:
+#
+#     game (
+#         name "Astrosmash (1981) (Mattel)"
+#         description "Astrosmash (1981) (Mattel)"
+#         rom ( name "Astrosmash (1981) (Mattel).int" size 8192 crc 00be8dba md5 ... sha1 ... )
+#     )
+#
+token_reg = re.compile(r'"([^"]*)"|(\()|(\))|([^\s()"]+)')
+hex_reg = re.compile(r'^[0-9a-f]+$', re.IGNORECASE)
 
-def read_cowering_data(filename):
-    output = dict()
-    with open(filename, 'r') as fh:
-        in_game = False
+cowering_index_version = 1
 
-        for line in fh.readlines():
-            if line[:4] == 'game':
-                in_game = True
+
+def dat_tokens(fh):
+    # generator over the tokens of a clrmamepro DAT, a line at a time.  Quoted strings come back as ('str', value),
+    # everything else as ('word', value), '(' or ')'.
+    for line in fh:
+        for matcher in token_reg.finditer(line):
+            quoted, opening, closing, word = matcher.groups()
+            if quoted is not None:
+                yield ('str', quoted)
+            elif opening is not None:
+                yield '('
+            elif closing is not None:
+                yield ')'
+            else:
+                yield ('word', word)
+    return
+
+
+def read_dat_roms(filename):
+    #
+    # Generator yielding a dict for every "rom ( ... )" inside a "game ( ... )" block of a clrmamepro DAT.  The dict
+    # carries whichever of name, size, crc, md5 and sha1 the rom has, plus the game's description (or name, if it
+    # has no description) as good_name.
+    #
+    with open(filename, 'r', errors='replace') as fh:
+        depth = 0
+        block = None
+        game = None
+        rom = None
+        key = None
+        prev = None
+
+        for tok in dat_tokens(fh):
+            if tok == '(':
+                depth += 1
+                kind = prev[1] if isinstance(prev, tuple) else None
+                if depth == 1:
+                    block = kind
+                    game = {'name': None, 'description': None, 'roms': []}
+                elif depth == 2 and block == 'game' and kind == 'rom':
+                    rom = {}
+                key = None
+                prev = tok
+                continue
+
+            if tok == ')':
+                if depth == 2 and rom is not None:
+                    game['roms'].append(rom)
+                    rom = None
+                elif depth == 1 and block == 'game':
+                    good_name = game['description'] or game['name'] or ''
+                    for r in game['roms']:
+                        r['good_name'] = good_name
+                        yield r
+                    block = None
+                    game = None
+                depth = max(depth - 1, 0)
+                key = None
+                prev = tok
+                continue
+
+            prev = tok
+            if block != 'game':
+                continue
+
+            # inside a block everything is "key value" pairs
+            if key is None:
+                key = tok[1]
                 continue
 
-            if in_game is True:
-                if line == ')':
-                    in_game = False
-                    continue
+            value = tok[1]
+            if rom is not None and depth == 2:
+                rom[key] = value
+            elif depth == 1 and key in ('name', 'description'):
+                game[key] = value
+            key = None
+    return
+
+
+def normalize_rom(rom):
+    # turn the strings from the DAT into an int CRC, int size and lower case hashes.  Returns None for roms without
+    # a usable CRC.
+    crc = rom.get('crc')
+    if crc is None or hex_reg.match(crc) is None:
+        return None
+
+    out = {'crc': int(crc, 16), 'good_name': rom['good_name'], 'name': rom.get('name'), 'size': None}
+    try:
+        out['size'] = int(rom['size'])
+    except (KeyError, ValueError):
+        pass
+
+    for k in ('md5', 'sha1'):
+        if k in rom.keys() and hex_reg.match(rom[k]) is not None:
+            out[k] = rom[k].lower()
+    return out
+
+
+def build_cowering_index(filename):
+    # CRC (as an int) -> (good_name, size)
+    index = {}
+    for rom in read_dat_roms(filename):
+        rom = normalize_rom(rom)
+        if rom is None:
+            continue
+
+        if rom['good_name'] == '':
+            print(f"WARN: good_name is blank: crc={rom['crc']:08x}")
+
+        index[rom['crc']] = (rom['good_name'], rom['size'])
+    return index
+
 
-            p = re.compile('.*description "(.*)"')
-            matcher = p.search(line)
-            if matcher is not None:
-                good_name = matcher.group(1)
+def load_cowering_index(filename, cache_file=None):
+    #
+    # Load the CRC index for a Cowering DAT, using the cache file when it was built from the DAT as it is now (same
+    # size and mtime).  Otherwise the DAT is parsed and, if there is a cache file, the cache is rewritten.
+    #
+    st = os.stat(filename)
 
-            p = re.compile('.*rom \( name.*size.*crc ([0-9a-f]+) \)', re.IGNORECASE)
-            matcher = p.search(line)
-            if matcher is not None:
-                crc = matcher.group(1).lower()
+    if cache_file is not None and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'r') as fh:
+                cached = json.load(fh)
 
-                while len(crc) < 8:
-                    crc = "0" + crc
+            if (cached['version'] == cowering_index_version and cached['dat'] == os.path.abspath(filename) and
+                    cached['size'] == st.st_size and cached['mtime_ns'] == st.st_mtime_ns):
+                return {crc: (good_name, size) for crc, good_name, size in cached['roms']}
+        except Exception:
+            # a damaged cache just gets rebuilt
+            pass
 
-                if good_name == '':
-                    print(f"WARN: good_name is blank: crc={crc}")
+    index = build_cowering_index(filename)
 
-                output[crc] = good_name
+    if cache_file is not None:
+        cached = {'version': cowering_index_version, 'dat': os.path.abspath(filename), 'size': st.st_size,
+                  'mtime_ns': st.st_mtime_ns, 'roms': [[crc, v[0], v[1]] for crc, v in index.items()]}
+        temp_file = f"{cache_file}.tmp.{os.getpid()}"
+        try:
+            with open(temp_file, 'w') as fh:
+                json.dump(cached, fh, separators=(',', ':'))
+            os.replace(temp_file, cache_file)
+        except OSError:
+            # not being able to write the cache only costs time on the next run
+            if os.path.isfile(temp_file):
+                os.remove(temp_file)
+    return index
 
-                good_name = ''
-                crc = 0
 
-    return output
+def read_cowering_data(filename, cache_file=None):
+    # zero padded, lower case CRC string -> good_name
+    index = load_cowering_index(filename, cache_file)
+    return {f"{crc:08x}": v[0] for crc, v in index.items()}
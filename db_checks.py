@@ -0,0 +1,715 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import re
+import json
+import time
+import queue
+import hashlib
+import datetime
+import concurrent.futures
+
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(tool_dir)
+
+import fingerprint
+from file_parser import allowed_romfile_extensions
+
+registered_checks = []
+
+# bump this whenever the layout of the check-state file or its findings changes
+check_state_version = 2
+
+
+def registered_check(check_id, title=None, inputs=('db',), io_bound=False, min_level=1, needs_menufile=False):
+    #
+    # Decorator to register a DbChecker method as one of the checkdb checks.
+    #
+    # inputs lists the data the check reads ('db', 'cowering', 'roms', 'manuals', 'menufile'); shared inputs are
+    # prepared once before any check starts.  io_bound checks (directory scans, file reads, ROM hashing) run in a
+    # thread pool while the CPU-bound DB checks run in the main thread.  Findings are always reported in the order
+    # the checks are registered, no matter which finishes first.
+    #
+    def decorator(func):
+        registered_checks.append({'id': check_id,
+                                  'title': title,
+                                  'inputs': inputs,
+                                  'io_bound': io_bound,
+                                  'min_level': min_level,
+                                  'needs_menufile': needs_menufile,
+                                  'func': func})
+        return func
+    return decorator
+
+
+class DbChecker:
+    #
+    # The checks behind "inty checkdb".
+    #
+    # Every finding belongs to a unit of work: a single record, a single file, or the DB as a whole.  Each unit is
+    # stored in the check-state file along with a hash of everything its findings depend on.  In an incremental run a
+    # unit whose inputs hash hasn't changed reuses its stored findings instead of being checked again, so the report
+    # is still complete, but only changed records, changed files and whatever depends on them get rechecked.
+    #
+    def __init__(self, inty, level=1, menufile=None, state_file=None):
+        self.inty = inty
+        self.db = inty.get_db()
+        self.roms_repository = inty.get_roms_repository()
+        self.manuals_repository = inty.manuals_repository
+        self.level = level
+        self.menufile = menufile
+        self.state_file = state_file
+        self.incremental = False
+        self.prev_state = {}
+        self.state = {}
+
+        self.record_hashes = {}
+        for rec in self.db:
+            self.record_hashes[id(rec)] = self.hash_of(rec)
+        self.db_hash = self.hash_of(list(self.record_hashes.values()))
+
+        # only loaded (and hashed) once a check that reads it runs
+        self.cowering_data = None
+        self.cowering_hash = None
+        self.cowering_indexes = None
+        self.files_in_repo = None
+        self.repo_manifest = None
+        self.manuals = None
+        self.output_format = 'text'
+
+        # per check bookkeeping for the summaries: wall time, items examined and how many units came from the state
+        self.timings = {}
+        self.examined = {}
+        self.reused = {}
+        return
+
+    def hash_of(self, *parts):
+        return hashlib.md5(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def finding(self, check, message, rec_id=None, filename=None, severity='warning'):
+        return {'check': check, 'severity': severity, 'id': rec_id, 'file': filename, 'message': message}
+
+    def load_state(self):
+        self.prev_state = {}
+        if self.state_file is not None and os.path.isfile(self.state_file):
+            try:
+                with open(self.state_file, 'r') as fh:
+                    self.prev_state = json.load(fh)
+                if self.prev_state.get('version') != check_state_version:
+                    self.prev_state = {}
+            except Exception:
+                # a damaged state file just means everything gets checked
+                self.prev_state = {}
+        return
+
+    def save_state(self):
+        if self.state_file is None:
+            return
+
+        # sections that weren't run this time (e.g. a lower --level) keep what they had
+        state = dict(self.prev_state)
+        state.update(self.state)
+        state['version'] = check_state_version
+
+        temp_file = f"{self.state_file}.tmp.{os.getpid()}"
+        with open(temp_file, 'w') as fh:
+            json.dump(state, fh)
+        os.replace(temp_file, self.state_file)
+        return
+
+    def cached_unit(self, section, key, inputs_hash):
+        if self.incremental is False:
+            return None
+
+        prev = self.prev_state.get(section, {}).get(key)
+        if prev is None or prev['hash'] != inputs_hash:
+            return None
+
+        self.reused[section] = self.reused.get(section, 0) + 1
+        return prev['findings']
+
+    def store_unit(self, section, key, inputs_hash, findings):
+        self.state.setdefault(section, {})[key] = {'hash': inputs_hash, 'findings': findings}
+        return
+
+    def unit(self, section, key, inputs_hash, check_func, *args):
+        findings = self.cached_unit(section, key, inputs_hash)
+        if findings is None:
+            findings = list(check_func(*args))
+        self.store_unit(section, key, inputs_hash, findings)
+        return findings
+
+    def selected_checks(self, only=None, skip=None):
+        known_ids = list(map(lambda x: x['id'], registered_checks))
+        for check_id in list(only or []) + list(skip or []):
+            if check_id not in known_ids:
+                raise Exception(f"Unknown check {check_id}, the checks are: {', '.join(known_ids)}")
+
+        checks = []
+        for chk in registered_checks:
+            if self.level < chk['min_level']:
+                continue
+            if chk['needs_menufile'] is True and self.menufile is None:
+                continue
+            if only is not None and chk['id'] not in only:
+                continue
+            if skip is not None and chk['id'] in skip:
+                continue
+            checks.append(chk)
+        return checks
+
+    def prepare_inputs(self, checks):
+        inputs = set()
+        for chk in checks:
+            inputs.update(chk['inputs'])
+
+        if 'cowering' in inputs:
+            self.get_cowering_indexes()
+        if 'roms' in inputs:
+            self.files_in_repo = self.get_files_in_repository()
+        if 'manuals' in inputs:
+            self.manuals = self.get_manuals()
+        return
+
+    def run_check(self, chk):
+        # generator over one check's findings that also keeps track of the check's wall time
+        check_start = time.perf_counter()
+        for finding in chk['func'](self):
+            yield finding
+        self.timings[chk['id']] = time.perf_counter() - check_start
+        return
+
+    def run_check_into_queue(self, chk, results):
+        try:
+            for finding in self.run_check(chk):
+                results.put(('finding', finding))
+            results.put(('done', None))
+        except Exception as errmsg:
+            results.put(('error', errmsg))
+        return
+
+    def emit(self, obj):
+        # one JSON object per line, flushed so a consumer can follow along while the checks run
+        sys.stdout.write(json.dumps(obj))
+        sys.stdout.write("\n")
+        sys.stdout.flush()
+        return
+
+    def report_title(self, chk):
+        if self.output_format == 'text' and chk['title'] is not None:
+            self.inty.banner(chk['title'])
+        return
+
+    def report_finding(self, finding):
+        if self.output_format == 'jsonl':
+            out = {'type': 'finding'}
+            out.update(finding)
+            self.emit(out)
+        else:
+            print(finding['message'])
+        return
+
+    def report_check_done(self, chk, findings_count):
+        if self.output_format == 'jsonl':
+            self.emit({'type': 'summary',
+                       'check': chk['id'],
+                       'elapsed': round(self.timings[chk['id']], 6),
+                       'examined': self.examined.get(chk['id'], 0),
+                       'reused': self.reused.get(chk['id'], 0),
+                       'findings': findings_count})
+        return
+
+    def run(self, incremental=False, only=None, skip=None, output_format='text'):
+        self.incremental = incremental
+        self.output_format = output_format
+        self.load_state()
+
+        started = datetime.datetime.now().isoformat(timespec='seconds')
+        run_start = time.perf_counter()
+        checks = self.selected_checks(only, skip)
+        self.prepare_inputs(checks)
+
+        io_checks = list(filter(lambda x: x['io_bound'] is True, checks))
+        results = {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(io_checks))) as pool:
+            for chk in io_checks:
+                results[chk['id']] = queue.Queue()
+                pool.submit(self.run_check_into_queue, chk, results[chk['id']])
+
+            for chk in checks:
+                self.report_title(chk)
+                findings_count = 0
+
+                if chk['io_bound'] is False:
+                    for finding in self.run_check(chk):
+                        self.report_finding(finding)
+                        findings_count += 1
+                    self.report_check_done(chk, findings_count)
+                    continue
+
+                # stream this check's findings as they arrive; anything it found while earlier checks were still
+                # being reported has been waiting in its queue
+                while True:
+                    kind, item = results[chk['id']].get()
+                    if kind == 'done':
+                        break
+                    if kind == 'error':
+                        raise item
+                    self.report_finding(item)
+                    findings_count += 1
+                self.report_check_done(chk, findings_count)
+
+        self.save_state()
+        elapsed = time.perf_counter() - run_start
+
+        if self.output_format == 'jsonl':
+            self.emit({'type': 'run',
+                       'started': started,
+                       'level': self.level,
+                       'incremental': self.incremental,
+                       'checks': list(map(lambda x: x['id'], checks)),
+                       'elapsed': round(elapsed, 6)})
+        else:
+            timings = list(map(lambda x: (x['id'], self.timings[x['id']]), checks))
+            timings.append(('total (wall)', elapsed))
+            self.print_section_timings(timings)
+        return
+
+    def print_section_timings(self, timings):
+        self.inty.banner("Time spent in each check")
+        for section, elapsed in timings:
+            print(f"{section:<40} {elapsed:8.3f}s")
+        return
+
+    #
+    # DB consistency
+    #
+
+    @registered_check('repeated_records', "Checking for repeated game data and repeated ROMs in the DB")
+    def check_repeated_records(self):
+        self.examined['repeated_records'] = len(self.db)
+        return self.unit('repeated_records', 'db', self.hash_of(self.db_hash, self.level),
+                         self.find_repeated_records)
+
+    def find_repeated_records(self):
+        # group the records by each field that should be unique with one hash map per field, so each repeat is
+        # reported once for the whole group rather than once for every pair of records in it
+        check = 'repeated_records'
+        unique_fields = (('name', 'game name'),
+                         ('good_name', 'good name'),
+                         ('id', 'id'),
+                         ('bin_md5', 'bin_md5'),
+                         ('bin_crc32', 'bin_crc32'),
+                         ('cowering_crc32', 'cowering_crc32'),
+                         ('cc3_filename', 'cc3_filename'))
+
+        groups = {}
+        for field, label in unique_fields:
+            groups[field] = {}
+        same_rom_image = {}
+        same_rom_data = {}
+
+        for rec in self.db:
+            for field, label in unique_fields:
+                if rec[field] is not None:
+                    groups[field].setdefault(rec[field], []).append(rec)
+
+            if rec['rom_data_md5'] is not None:
+                same_rom_data.setdefault(rec['rom_data_md5'], []).append(rec)
+
+                if rec['rom_attr_md5'] is not None:
+                    same_rom_image.setdefault((rec['rom_data_md5'], rec['rom_attr_md5']), []).append(rec)
+
+        for field, label in unique_fields:
+            for value, recs in groups[field].items():
+                if len(recs) > 1:
+                    ids = ', '.join(map(lambda x: x['id'], recs))
+                    if field == 'id':
+                        yield self.finding(check, f"{value} (id) is in the DB {len(recs)} times!!!", value,
+                                           severity='error')
+                    else:
+                        severity = 'warning'
+                        if field == 'cc3_filename':
+                            severity = 'error'
+                        yield self.finding(check, f"{value} ({label}) is in the DB {len(recs)} times: {ids}",
+                                           recs[0]['id'], severity=severity)
+
+        for recs in same_rom_image.values():
+            if len(recs) > 1:
+                yield self.finding(check, f"{' and '.join(map(lambda x: str(x['name']), recs))} are the same ROM "
+                                   f"image", recs[0]['id'])
+
+        if self.level > 1:
+            for recs in same_rom_data.values():
+                if len(recs) > 1:
+                    yield self.finding(check, f"{' and '.join(map(lambda x: str(x['name']), recs))} have the same "
+                                       f"ROM data MD5", recs[0]['id'])
+        return
+
+    def get_cowering_data(self):
+        if self.cowering_data is None:
+            self.cowering_data = self.inty.get_cowering_data()
+            self.cowering_hash = self.hash_of(self.cowering_data)
+        return self.cowering_data
+
+    def get_cowering_indexes(self):
+        # reverse index of Cowering's data (good_name -> CRCs) plus CRC -> record for the DB, so the Cowering cross
+        # checks are lookups rather than scans.  CRCs are keyed lower case to match the Cowering data file.
+        if self.cowering_indexes is None:
+            cowering_crcs_by_name = {}
+            for crc, good_name in self.get_cowering_data().items():
+                cowering_crcs_by_name.setdefault(good_name, set()).add(crc)
+
+            records_by_crc = {}
+            for rec in self.db:
+                for field in ('bin_crc32', 'cowering_crc32'):
+                    if rec[field] is not None:
+                        records_by_crc.setdefault(rec[field].lower(), rec)
+
+            self.cowering_indexes = (cowering_crcs_by_name, records_by_crc)
+        return self.cowering_indexes
+
+    @registered_check('records', inputs=('db', 'cowering'))
+    def check_records(self):
+        self.examined['records'] = len(self.db)
+        self.get_cowering_data()
+        recs_by_id = {}
+        for rec in self.db:
+            recs_by_id.setdefault(rec['id'], rec)
+
+        seen_keys = set()
+        for rec in self.db:
+            key = rec['id']
+            while key in seen_keys:
+                key += '_'
+            seen_keys.add(key)
+
+            # a record's findings depend on the record itself, on whether its variant_of parent exists, and on
+            # Cowering's data
+            parent = recs_by_id.get(rec['variant_of'])
+            parent_hash = None
+            if parent is not None:
+                parent_hash = self.record_hashes[id(parent)]
+
+            inputs_hash = self.hash_of(self.record_hashes[id(rec)], parent_hash, self.cowering_hash)
+            for finding in self.unit('records', key, inputs_hash, self.check_record, rec, parent):
+                yield finding
+        return
+
+    def check_record(self, rec, parent):
+        check = 'records'
+        rec_id = rec['id']
+
+        if rec['cc3_desc'] is not None and len(rec['cc3_desc']) > 20:
+            yield self.finding(check, f"{rec_id} has a CC3 description that is too long.", rec_id)
+
+        if rec['cc3_filename'] is not None and rec['cc3_filename'] == rec['name']:
+            yield self.finding(check, f"{rec_id} doesn't appear to have a valid name", rec_id)
+
+        if rec['tags'] is None or len(rec['tags']) == 0:
+            yield self.finding(check, f"{rec_id} doesn't have any tags", rec_id)
+
+        if (rec['cc3_filename'] is None or len(rec['cc3_filename']) == 0) and 'cowering' not in str(rec['options']):
+            yield self.finding(check, f"{rec_id} doesn't have a cc3_filename", rec_id)
+
+        if (rec['cc3_filename'] == rec['name']) and (rec['cc3_filename'] == rec['cc3_desc']):
+            yield self.finding(check, f"{rec_id} doesn't appear to have a fully fleshed out record", rec_id)
+
+        rec_crcs = set()
+        for field in ('bin_crc32', 'cowering_crc32'):
+            if rec[field] is not None:
+                rec_crcs.add(rec[field].lower())
+
+        if rec['good_name'] is not None:
+            for crc in rec_crcs:
+                cow_name = self.cowering_data.get(crc)
+                if cow_name is not None and rec['good_name'] != cow_name:
+                    yield self.finding(check, f"{rec_id} has a bad good_name", rec_id)
+                    break
+
+            # check against Cowering's data
+            cowering_crcs_by_name, records_by_crc = self.get_cowering_indexes()
+            cow_crcs = cowering_crcs_by_name.get(rec['good_name'])
+            if cow_crcs is None:
+                yield self.finding(check, f"Never found a CRC in the Cowering datafile for {rec_id}'s good_name",
+                                   rec_id)
+            elif len(cow_crcs.intersection(rec_crcs)) == 0:
+                yield self.finding(check, f"{rec_id} has a CRC32 that doesn't match Cowering's for its good_name",
+                                   rec_id)
+
+        # check variant ID
+        if rec['variant_of'] is not None:
+            if parent is None or parent is rec:
+                yield self.finding(check, f"{rec_id} has a variant_of that doesn't point to any valid record", rec_id,
+                                   severity='error')
+        return
+
+    @registered_check('cowering_coverage', "Checking that all Cowering CRC32s are in the DB",
+                      inputs=('db', 'cowering'))
+    def check_cowering_coverage(self):
+        self.examined['cowering_coverage'] = len(self.get_cowering_data())
+        return self.unit('cowering_coverage', 'db', self.hash_of(self.db_hash, self.cowering_hash),
+                         self.find_uncovered_cowering_crcs)
+
+    def find_uncovered_cowering_crcs(self):
+        check = 'cowering_coverage'
+        cowering_crcs_by_name, records_by_crc = self.get_cowering_indexes()
+
+        for crc, good_name in self.cowering_data.items():
+            rec = records_by_crc.get(crc)
+            if rec is None:
+                yield self.finding(check, f"Didn't find a CRC32 in the DB for {crc}: {good_name}")
+            elif rec['good_name'] != good_name:
+                yield self.finding(check, f"{rec['id']} has a good_name that doesn't match Cowering's", rec['id'])
+        return
+
+    #
+    # repository files
+    #
+
+    def get_files_in_repository(self):
+        # from the repository manifest, which only rehashes the files that have changed
+        self.repo_manifest = self.inty.get_repository_manifest()
+        files_in_repo = set()
+        for name in self.repo_manifest.files.keys():
+            basename, ext = os.path.splitext(name)
+            if ext[1:] in allowed_romfile_extensions:
+                files_in_repo.add(name)
+        return files_in_repo
+
+    def get_records_by_file(self):
+        # NOTE: cowering in the options indicates this record is only here because it is in the cowering data
+        # file and does not represent real rom file(s) I own
+        recs_by_file = {}
+        for rec in self.db:
+            if rec['cc3_filename'] is None or 'cowering' in str(rec['options']):
+                continue
+
+            filename = rec['cc3_filename'].upper()
+            basename, ext = os.path.splitext(filename)
+            if ext[1:] in allowed_romfile_extensions:
+                recs_by_file.setdefault(filename, []).append(rec)
+        return recs_by_file
+
+    @registered_check('repository_files', "Checking the ROMs in the roms dir against the DB",
+                      inputs=('db', 'roms'), io_bound=True, min_level=2)
+    def check_repository_files(self, workers=None):
+        #
+        # Work out which files need looking at, fingerprint them all in a pool of worker processes (washes of
+        # unchanged files come out of the fingerprint cache), then check each one against the DB as its result
+        # comes in.
+        #
+        self.examined['repository_files'] = len(self.files_in_repo)
+        recs_by_file = self.get_records_by_file()
+
+        # a file referenced by records depends only on those records; anything else is looked up in the whole DB
+        pending = {}
+        for romfile in sorted(self.files_in_repo):
+            filename = f"{self.roms_repository}/{romfile}"
+            st = os.stat(filename)
+
+            if romfile in recs_by_file.keys():
+                depends_on = list(map(lambda x: self.record_hashes[id(x)], recs_by_file[romfile]))
+            else:
+                depends_on = self.db_hash
+
+            inputs_hash = self.hash_of(st.st_size, st.st_mtime_ns, depends_on)
+            findings = self.cached_unit('repository_files', romfile, inputs_hash)
+
+            if findings is None:
+                pending[filename] = (romfile, inputs_hash)
+                continue
+
+            self.store_unit('repository_files', romfile, inputs_hash, findings)
+            for finding in findings:
+                yield finding
+
+        if len(pending) == 0:
+            return
+
+        recs_by_checksums = self.get_records_by_checksums()
+        cache = fingerprint.FingerprintCache(self.inty.fingerprint_cache_file)
+
+        for filename, wash, errmsg in fingerprint.fingerprint_files(pending.keys(), cache, workers,
+                                                                    self.inty.get_temp_dir()):
+            romfile, inputs_hash = pending[filename]
+            findings = list(self.check_repository_file(romfile, wash, errmsg, recs_by_file.get(romfile),
+                                                       recs_by_checksums))
+            self.store_unit('repository_files', romfile, inputs_hash, findings)
+            for finding in findings:
+                yield finding
+        return
+
+    def get_records_by_checksums(self):
+        # index the DB by the file checksums, for files that aren't in the DB under their own names
+        recs_by_checksums = {}
+        for rec in self.db:
+            if rec['rom_data_md5'] is not None and rec['rom_attr_md5'] is not None:
+                recs_by_checksums.setdefault(('rom', rec['rom_data_md5'], rec['rom_attr_md5']), rec)
+            if rec['luigi_crc32s'] is not None:
+                recs_by_checksums.setdefault(('luigi', rec['luigi_crc32s']), rec)
+            if rec['bin_crc32'] is not None:
+                recs_by_checksums.setdefault(('bin', rec['bin_crc32'].upper()), rec)
+        return recs_by_checksums
+
+    def check_repository_file(self, romfile, wash, errmsg, recs, recs_by_checksums):
+        check = 'repository_files'
+        compared_fields = (('bin_md5', 'bin MD5'),
+                           ('bin_crc32', 'bin CRC32'),
+                           ('rom_data_md5', 'rom data MD5'),
+                           ('rom_attr_md5', 'rom attr MD5'))
+
+        if wash is None:
+            yield self.finding(check, f"Couldn't wash {romfile}: {errmsg}", None, romfile, 'error')
+            return
+
+        wash_fields = fingerprint.record_fields_from_wash(wash)
+
+        if recs is not None:
+            for rec in recs:
+                for field, label in compared_fields:
+                    if (wash_fields.get(field) is not None and rec[field] is not None and
+                            wash_fields[field].lower() != rec[field].lower()):
+                        yield self.finding(check, f"The {label} for {rec['id']} in the DB doesn't match what is in "
+                                           f"the romfile in the repository ({romfile})", rec['id'], romfile, 'error')
+            return
+
+        # we didn't find this .rom file in the DB under cc3_filename.rom
+        # check to see if this .rom file is actually in the DB under another name
+        rec = None
+        if 'rom_data_md5' in wash_fields.keys():
+            rec = recs_by_checksums.get(('rom', wash_fields['rom_data_md5'], wash_fields['rom_attr_md5']))
+        if rec is None and 'luigi_crc32s' in wash_fields.keys():
+            rec = recs_by_checksums.get(('luigi', wash_fields['luigi_crc32s']))
+        if rec is None and 'bin_crc32' in wash_fields.keys():
+            rec = recs_by_checksums.get(('bin', wash_fields['bin_crc32'].upper()))
+
+        if rec is not None:
+            yield self.finding(check, f"{romfile} is in the repository, but it is in the DB under {rec['id']} "
+                               f"({str(rec['cc3_filename']).upper()})", rec['id'], romfile)
+        else:
+            yield self.finding(check, f"{romfile} is in the repository, but it is not in the DB", None, romfile)
+        return
+
+    @registered_check('missing_files', "Checking that all ROMs in the DB are in the roms dir",
+                      inputs=('db', 'roms'), io_bound=True, min_level=2)
+    def check_missing_files(self):
+        self.examined['missing_files'] = len(self.db)
+        return self.unit('missing_files', 'db', self.hash_of(self.db_hash, sorted(self.files_in_repo)),
+                         self.find_missing_files, self.files_in_repo)
+
+    def find_missing_files(self, files_in_repo):
+        recs_by_file = self.get_records_by_file()
+
+        for dbfile in sorted(recs_by_file.keys()):
+            if dbfile not in files_in_repo:
+                for rec in recs_by_file[dbfile]:
+                    yield self.finding('missing_files', f"{dbfile} is referenced in the DB ({rec['id']}), but it "
+                                       f"isn't in the repository", rec['id'], dbfile, 'error')
+        return
+
+    @registered_check('repository_duplicates', "Checking for ROMs stored more than once in the roms dir",
+                      inputs=('roms',), io_bound=True, min_level=2)
+    def check_repository_duplicates(self):
+        # straight from the manifest's index of the repository by content
+        self.examined['repository_duplicates'] = len(self.files_in_repo)
+        duplicates = [names for names in self.repo_manifest.duplicates() if set(names) <= self.files_in_repo]
+        return self.unit('repository_duplicates', 'roms', self.hash_of(duplicates), self.find_repository_duplicates,
+                         duplicates)
+
+    def find_repository_duplicates(self, duplicates):
+        for names in sorted(duplicates):
+            yield self.finding('repository_duplicates', f"{', '.join(names)} all have the same contents", None,
+                               names[0])
+        return
+
+    #
+    # CC3 menus and manuals
+    #
+
+    def get_manuals(self):
+        manuals = set()
+        for entry in os.scandir(self.manuals_repository):
+            if entry.name.endswith('.TXT') and entry.is_file():
+                manuals.add(entry.name)
+        return manuals
+
+    @registered_check('menu_entries', "Checking the CC3 menu entries", inputs=('db', 'menufile', 'manuals'),
+                      io_bound=True, needs_menufile=True)
+    def check_menu_entries(self):
+        with open(self.menufile, 'r') as fh:
+            menulist = fh.read()
+
+        self.examined['menu_entries'] = len(menulist.splitlines())
+        inputs_hash = self.hash_of(menulist, self.db_hash, sorted(self.manuals))
+        return self.unit('menu_entries', self.menufile, inputs_hash, self.find_bad_menu_entries, menulist,
+                         self.manuals)
+
+    def find_bad_menu_entries(self, menulist, manuals):
+        # check the entries in the MENULIST to be sure that they have filenames and
+        # descriptions
+        check = 'menu_entries'
+        blank_reg = re.compile(r'^\s*$')
+
+        for line in menulist.splitlines():
+            tag = line[:8].strip().lower()
+            if tag == '':
+                continue
+
+            # hack for menu - it should get the game tag records
+            if tag == 'menu':
+                tag = 'game'
+
+            for rec in self.inty.get_all_records_from_tag(tag):
+                if rec['cc3_desc'] is None:
+                    yield self.finding(check, f"{rec['id']} is missing a cc3_desc", rec['id'])
+                elif blank_reg.search(rec['cc3_desc']) is not None:
+                    yield self.finding(check, f"{rec['id']} has a blank cc3_desc", rec['id'])
+
+                if rec['cc3_filename'] is None:
+                    continue
+
+                basename, ext = os.path.splitext(rec['cc3_filename'])
+                romtags = rec['tags'].split(',')
+                manfile = f"{basename.upper()}.TXT"
+                if manfile not in manuals and 'proto' not in romtags and 'demo' not in romtags:
+                    yield self.finding(check, f"{rec['id']} is referenced for the CC3, but missing a manual file "
+                                       f"({manfile})", rec['id'], manfile)
+        return
+
+    @registered_check('manuals', "Checking manuals", inputs=('db', 'manuals'), io_bound=True, min_level=3)
+    def check_manuals(self):
+        rom_basenames = set()
+        for rec in self.db:
+            if rec['cc3_filename'] is not None:
+                basename, ext = os.path.splitext(rec['cc3_filename'].lower())
+                if ext[1:].upper() in allowed_romfile_extensions:
+                    rom_basenames.add(basename)
+
+        self.examined['manuals'] = len(self.manuals)
+        for manfile in sorted(self.manuals):
+            filename = f"{self.manuals_repository}/{manfile}"
+            st = os.stat(filename)
+
+            basename, ext = os.path.splitext(manfile)
+            referenced = basename.lower() in rom_basenames
+
+            inputs_hash = self.hash_of(st.st_size, st.st_mtime_ns, referenced)
+            for finding in self.unit('manuals', manfile, inputs_hash, self.check_manual, manfile, referenced):
+                yield finding
+        return
+
+    def check_manual(self, manfile, referenced):
+        if referenced is False:
+            yield self.finding('manuals', f"{manfile} is in the manuals repository, but isn't referenced in the DB",
+                               None, manfile)
+
+        with open(f"{self.manuals_repository}/{manfile}", 'r') as fh:
+            for line in fh:
+                line = line.strip('\r\n')
+                if len(line) > 20:
+                    yield self.finding('manuals', f"{manfile} has line(s) longer than 20 characters", None, manfile)
+                    break
+        return
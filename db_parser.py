@@ -3,6 +3,7 @@
 import sys
 import os
 import re
+import shutil
 # import yaml
 
 tool_dir = os.path.dirname(os.path.abspath(__file__))
@@ -18,6 +19,18 @@ class DbParser(FileParser):
                              'bin_crc32', 'cowering_crc32', 'rom_data_crc16s', 'rom_attr_crc16', 'luigi_crc32s',
                              'encrypted', 'cc3_desc', 'cc3_filename', 'tags', 'paid', 'variant_of', 'author', 'year',
                              'options', 'kbdhackfile', 'cfg_file', 'comments')
+        self.tags_comment_prefix = '# possible tags:'
+
+        # serialized text of each record keyed by ID, split around the "possible tags" comment line since that line
+        # depends on the whole DB rather than the record.  Records in dirty_ids (or without cached text) get
+        # reserialized on the next write, everything else is written straight from here.
+        self.record_texts = {}
+        self.dirty_ids = set()
+        self.sorted_ids = []
+
+        # lookup indexes (field -> value -> position in self.db), built on demand and thrown away whenever records
+        # are added, replaced or reordered
+        self.field_indexes = {}
         return
 
     def get_fields_order(self):
@@ -38,20 +51,51 @@ class DbParser(FileParser):
                 db_header += "\n"
 
             # loop over records in the file
+            self.record_texts = {}
+            self.dirty_ids = set()
             while True:
-                rec = self.parse_ascii_record_from_file(fh)
+                raw_lines = []
+                rec = self.parse_ascii_record_from_file(fh, raw_lines)
                 if rec is not None:
                     d.append(rec)
+                    self.cache_record_text(rec['id'], raw_lines)
                 else:
                     break
+
+        # the file is normally already in ID order, so this is cheap
+        self.sorted_ids = sorted(map(lambda x: x['id'], d))
+        self.field_indexes = {}
         return (d, db_header)
 
+    def cache_record_text(self, rec_id, raw_lines):
+        # a repeated ID can't be cached by ID, so just make sure those get reserialized
+        if rec_id in self.record_texts or rec_id in self.dirty_ids:
+            self.record_texts.pop(rec_id, None)
+            self.dirty_ids.add(rec_id)
+            return
+
+        # drop the blank lines separating this record from the previous one
+        first = 0
+        while first < len(raw_lines) and raw_lines[first].strip() == '':
+            first += 1
+        lines = raw_lines[first:]
+
+        # only records that are complete and have the tags comment can be written back out as they were read
+        if len(lines) == 0 or not lines[-1].endswith('\n') or not lines[-1].startswith(self.db_delimiter):
+            return
+
+        for i in range(0, len(lines)):
+            if lines[i].startswith(self.tags_comment_prefix):
+                self.record_texts[rec_id] = (''.join(lines[:i]), ''.join(lines[i + 1:]) + '\n')
+                break
+        return
+
     def parse_ascii_record(self, filename):
         with open(filename, 'r') as fh:
             rec = self.parse_ascii_record_from_file(fh)
         return rec
 
-    def parse_ascii_record_from_file(self, fh):
+    def parse_ascii_record_from_file(self, fh, raw_lines=None):
         in_multi_line = False
         multi_line_attr = ''
         rec = {}
@@ -69,6 +113,9 @@ class DbParser(FileParser):
             if not line:
                 break
 
+            if raw_lines is not None:
+                raw_lines.append(line)
+
             line = line.strip()
 
             # keep blank lines in multi-line attrs, but skip otherwise
@@ -119,6 +166,52 @@ class DbParser(FileParser):
 
     def write_inty_data_file(self):
         inty_data_file = self.inty_data_file
+        temp_file = f"{inty_data_file}.tmp.{os.getpid()}"
+
+        recs_by_id = {}
+        for rec in self.db:
+            recs_by_id.setdefault(rec['id'], []).append(rec)
+
+        # untouched records come straight from the text cache, only new/changed ones get reserialized
+        tags_comment = self.format_tags_comment()
+        sorted_db = []
+        new_texts = {}
+        seen_ids = set()
+        chunks = [self.db_header, '\n']
+
+        for rec_id in self.sorted_ids:
+            rec = recs_by_id[rec_id].pop(0)
+            sorted_db.append(rec)
+
+            # repeated IDs never use the cache
+            unique = rec_id not in seen_ids and len(recs_by_id[rec_id]) == 0
+            seen_ids.add(rec_id)
+
+            text = None
+            if unique is True and rec_id not in self.dirty_ids:
+                text = self.record_texts.get(rec_id)
+
+            if text is None:
+                text = self.format_ascii_record(rec)
+                if unique is True:
+                    new_texts[rec_id] = text
+                else:
+                    self.record_texts.pop(rec_id, None)
+
+            chunks.append(text[0])
+            chunks.append(tags_comment)
+            chunks.append(text[1])
+
+        # write the whole DB to a temp file next to the real one and get it onto the disk before touching anything
+        try:
+            with open(temp_file, "w") as fh:
+                fh.write(''.join(chunks))
+                fh.flush()
+                os.fsync(fh.fileno())
+        except Exception:
+            if os.path.isfile(temp_file):
+                os.remove(temp_file)
+            raise
 
         # rotate old backups
         for i in range(self.number_of_backups_to_keep, 0, -1):
@@ -126,19 +219,27 @@ class DbParser(FileParser):
             if os.path.isfile(f"{inty_data_file}.bak.{j}"):
                 os.rename(f"{inty_data_file}.bak.{j}", f"{inty_data_file}.bak.{i}")
 
-        # save current file as backup
+        # save current file as backup - linked/copied rather than renamed so there is never a moment without a
+        # data file in place
         if os.path.isfile(inty_data_file):
-            os.rename(inty_data_file, f"{inty_data_file}.bak.0")
+            try:
+                os.link(inty_data_file, f"{inty_data_file}.bak.0")
+            except OSError:
+                shutil.copy2(inty_data_file, f"{inty_data_file}.bak.0")
 
-        sorted_db = sorted(self.db, key=lambda x: x['id'])
-        self.db = sorted_db
+        # atomically swap in the new file, then make the rename itself durable
+        os.replace(temp_file, inty_data_file)
 
-        with open(inty_data_file, "w") as fh:
-            fh.write(self.db_header)
-            fh.write('\n')
+        dir_fd = os.open(os.path.dirname(os.path.abspath(inty_data_file)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
 
-            for rom in self.db:
-                self.write_ascii_record_to_file(fh, rom)
+        self.db = sorted_db
+        self.field_indexes = {}
+        self.record_texts.update(new_texts)
+        self.dirty_ids = set()
 
         # with open('inty_data_file.yaml', 'w') as fh:
         #     yaml.dump(self.db, fh)
@@ -160,26 +261,41 @@ class DbParser(FileParser):
             output = outfile
         return output
 
-    def write_ascii_record_to_file(self, fh, rec):
+    def write_ascii_record_to_file(self, fh, rec, tags_comment=None):
         # print(f"rlrDEBUG write_ascii_record_to_file: rec=|{str(rec)}|")
+        if tags_comment is None:
+            tags_comment = self.format_tags_comment()
+
+        head, tail = self.format_ascii_record(rec)
+        fh.write(f'{head}{tags_comment}{tail}')
+        return
+
+    def format_tags_comment(self):
+        return f'{self.tags_comment_prefix}{",".join(self.get_all_tags())}\n'
+
+    def format_ascii_record(self, rec):
+        # returns the record text as two parts: everything before the "possible tags" comment and everything after it
+        head = []
+        tail = []
+        out = head
         for k in self.fields_order:
             if k == 'cc3_desc':
-                fh.write('#c3_desc=12345678901234567890\n')
+                out.append('#c3_desc=12345678901234567890\n')
             if k == 'tags':
-                fh.write('# possible tags:{",".join(self.get_all_tags())}\n')
+                out = tail
 
             if k not in rec.keys() or rec[k] is None:
-                fh.write(f'{k}=\n')
+                out.append(f'{k}=\n')
                 continue
 
             # NOTE: due to the above continue, rec[k] must exist and has a value
 
             if '\n' in str(rec[k]):
-                fh.write(f'{k}_multi_line_begin\n')
-                fh.write(rec[k])
-                fh.write(f'{k}_multi_line_end\n')
+                out.append(f'{k}_multi_line_begin\n')
+                out.append(rec[k])
+                out.append(f'{k}_multi_line_end\n')
             else:
-                fh.write(f'{k}{rec[k]}\n')
+                out.append(f'{k}={rec[k]}\n')
 
-        fh.write('\n{self.db_delimiter}\n\n')
-        return
+        tail.append(f'\n{self.db_delimiter}\n\n')
+        return (''.join(head), ''.join(tail))
@@ -0,0 +1,647 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import io
+import json
+import hashlib
+
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(tool_dir)
+
+import cdb
+import cc3
+import rom_links
+
+CRLF = f"{chr(13)}{chr(10)}"
+
+#
+# Export engine for everything generated from the DB: the cabinet lists, the Pi files and the CC3 menus.
+#
+# The DB records are sorted by name and filtered by tag once, and every record in that stream is handed to each of
+# the requested writers, so regenerating all the artifacts costs one pass however many there are.  A writer decides
+# which of the records it wants, buffers its output and puts its file(s) in place when it's finished.
+#
+# Given an ExportState, every output also records a hash of exactly what it was built from: the fields of each
+# record it used, plus any other inputs (options, the boxart listing, .LST files).  When an output's inputs are the
+# same as last time and the file on disk is still the one that was written, it's left alone rather than rewritten,
+# so unchanged files don't get synced to the SD cards again.  Writers with several outputs (the CC3 menus) track
+# each one separately.
+#
+
+export_targets = {}
+export_state_version = 2
+
+
+def export_target(name):
+    # class decorator registering an ExportWriter subclass as an "inty export --targets" target
+    def decorator(cls):
+        cls.target = name
+        export_targets[name] = cls
+        return cls
+    return decorator
+
+
+def hash_of(value):
+    return hashlib.md5(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def deps_hash(deps):
+    # the records go in as (id, hash) pairs in stream order, so an output is rebuilt when its records move around
+    return hash_of([deps['inputs'], list(deps['records'].items())])
+
+
+def describe_ids(what, ids):
+    ids = sorted(ids)
+    names = ', '.join(ids[:5])
+    if len(ids) > 5:
+        names += f" and {len(ids) - 5} more"
+    return f"{len(ids)} record{'s' if len(ids) != 1 else ''} {what} ({names})"
+
+
+def explain_changes(prev, deps):
+    # why an output's dependencies differ from the ones it was last built from, as a list of reasons
+    reasons = []
+    for name in sorted(set(prev['inputs'].keys()).union(deps['inputs'].keys())):
+        if prev['inputs'].get(name) != deps['inputs'].get(name):
+            reasons.append(f"{name} changed")
+
+    prev_ids = set(prev['records'].keys())
+    ids = set(deps['records'].keys())
+    changed = [i for i in ids.intersection(prev_ids) if prev['records'][i] != deps['records'][i]]
+
+    if len(ids - prev_ids) > 0:
+        reasons.append(describe_ids('added', ids - prev_ids))
+    if len(prev_ids - ids) > 0:
+        reasons.append(describe_ids('removed', prev_ids - ids))
+    if len(changed) > 0:
+        reasons.append(describe_ids('changed', changed))
+    if len(reasons) == 0 and list(prev['records'].keys()) != list(deps['records'].keys()):
+        reasons.append("record order changed")
+    return reasons
+
+
+class ExportState:
+    #
+    # What every output was last built from, keyed by its absolute path, along with the size and mtime of the file
+    # that was written.  With force, everything gets rebuilt.
+    #
+    def __init__(self, state_file, force=False):
+        self.state_file = state_file
+        self.force = force
+        self.artifacts = {}
+
+        if os.path.isfile(state_file):
+            try:
+                with open(state_file, 'r') as fh:
+                    state = json.load(fh)
+                if state['version'] == export_state_version:
+                    self.artifacts = state['artifacts']
+            except Exception:
+                # a damaged state file just means everything gets rebuilt
+                self.artifacts = {}
+        return
+
+    def check(self, path, deps):
+        # returns (whether the output needs writing, why)
+        if self.force is True:
+            return (True, "forced")
+
+        prev = self.artifacts.get(os.path.abspath(path))
+        if prev is None:
+            return (True, "no previous build recorded")
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            return (True, "output is missing")
+
+        if st.st_size != prev['size'] or st.st_mtime_ns != prev['mtime_ns']:
+            return (True, "output was changed after it was written")
+
+        if prev['hash'] != deps_hash(deps):
+            return (True, '; '.join(explain_changes(prev['deps'], deps)) or "inputs changed")
+        return (False, "inputs unchanged")
+
+    def record(self, path, deps):
+        st = os.stat(path)
+        self.artifacts[os.path.abspath(path)] = {'hash': deps_hash(deps), 'deps': deps, 'size': st.st_size,
+                                                 'mtime_ns': st.st_mtime_ns}
+        return
+
+    def save(self):
+        temp_file = f"{self.state_file}.tmp.{os.getpid()}"
+        with open(temp_file, 'w') as fh:
+            json.dump({'version': export_state_version, 'artifacts': self.artifacts}, fh)
+        os.replace(temp_file, self.state_file)
+        return
+
+
+def record_matches_filters(rec, filters):
+    # with filters, a record has to have every one of the tags
+    if filters is None or len(filters) == 0:
+        return True
+    if rec['tags'] is None:
+        return False
+
+    romtags = rec['tags'].split(',')
+    for filt in filters:
+        if filt not in romtags:
+            return False
+    return True
+
+
+def sorted_records(db, filters=None):
+    for rec in sorted(db, key=lambda x: x['name'] or ''):
+        if record_matches_filters(rec, filters):
+            yield rec
+    return
+
+
+class ExportWriter:
+    #
+    # Base class for the export targets.  The engine calls start(), then track(rec) and add(rec) for each record in
+    # the stream that wants(rec), then finish().  Output is buffered in memory and only goes to disk in finish()
+    # (under a temp name, renamed into place), so a failed export never leaves a half written artifact behind and
+    # an unchanged one is never touched.  An output filename of '-' is stdout.
+    #
+    # input_fields are the record fields that end up in the default output, plus name since the records come in
+    # sorted by it, and option_names the options that change it; anything else an output depends on is added with
+    # depends_on().  Bump format_version when the output format changes, so existing artifacts get rebuilt.
+    #
+    target = None
+    default_filename = None
+    input_fields = ()
+    option_names = ()
+    format_version = 1
+
+    def __init__(self, inty, out_dir='.', options=None, state=None):
+        self.inty = inty
+        self.out_dir = out_dir
+        self.options = options or {}
+        self.state = state
+        self.outputs = []
+
+        # output path -> {'inputs': {name: hash}, 'records': {id: hash}}, and (path, written, why) for each output
+        self.deps = {}
+        self.decisions = []
+        return
+
+    def output_path(self, filename):
+        if filename == '-' or os.path.isabs(filename):
+            return filename
+        return os.path.join(self.out_dir, filename)
+
+    def open_output(self, filename=None, binary=False):
+        if filename is None:
+            filename = self.options.get(f'{self.target}_file', self.default_filename)
+        path = self.output_path(filename)
+
+        if path == '-':
+            fh = sys.stdout.buffer if binary is True else sys.stdout
+        elif binary is True:
+            fh = io.BytesIO()
+        else:
+            fh = io.StringIO(newline='')
+        self.outputs.append((fh, path))
+        return fh
+
+    def close_outputs(self, keep=True):
+        for fh, path in self.outputs:
+            if path == '-':
+                fh.flush()
+                continue
+
+            if keep is False or self.should_write(path) is False:
+                continue
+
+            temp_file = f"{path}.tmp.{os.getpid()}"
+            try:
+                if isinstance(fh, io.BytesIO):
+                    fhw = open(temp_file, 'wb')
+                else:
+                    fhw = open(temp_file, 'w', newline='')
+                with fhw:
+                    fhw.write(fh.getvalue())
+                os.replace(temp_file, path)
+            except BaseException:
+                if os.path.isfile(temp_file):
+                    os.remove(temp_file)
+                raise
+            self.wrote(path)
+        self.outputs = []
+        return
+
+    def get_output_files(self):
+        return [self.output_path(self.options.get(f'{self.target}_file', self.default_filename))]
+
+    def get_deps(self, path=None):
+        if path is None:
+            path = self.get_output_files()[0]
+        return self.deps.setdefault(path, {'inputs': {}, 'records': {}})
+
+    def depends_on(self, name, value, path=None):
+        # something other than the DB records (options, a directory listing, a file's contents) the output uses
+        self.get_deps(path)['inputs'][name] = hash_of(value)
+        return
+
+    def depends_on_record(self, rec, fields=None, path=None):
+        if fields is None:
+            fields = self.input_fields
+        self.get_deps(path)['records'][rec['id']] = hash_of([rec.get(f) for f in fields])
+        return
+
+    def should_write(self, path):
+        # decide (and remember why) whether an output has to be written
+        if self.state is None or path == '-':
+            return True
+
+        write, reason = self.state.check(path, self.get_deps(path))
+        self.decisions.append((path, write, reason))
+        return write
+
+    def wrote(self, path):
+        if self.state is not None and path != '-':
+            self.state.record(path, self.get_deps(path))
+        return
+
+    def start(self):
+        return
+
+    def wants(self, rec):
+        return True
+
+    def track(self, rec):
+        self.depends_on_record(rec)
+        return
+
+    def add(self, rec):
+        return
+
+    def finish(self):
+        self.close_outputs()
+        return
+
+    def abort(self):
+        self.close_outputs(keep=False)
+        return
+
+
+@export_target('gamelist')
+class GamelistWriter(ExportWriter):
+    # gamelist.xml for EmulationStation on the MAME cab
+    default_filename = 'gamelist.xml'
+    input_fields = ('cc3_filename', 'name', 'variant_of')
+    option_names = ('noimages',)
+
+    def start(self):
+        self.boxart = {}
+        if self.options.get('noimages') is not True:
+            for bfile in os.listdir(self.inty.get_boxart_repository()):
+                basename, ext = os.path.splitext(bfile)
+                self.boxart[basename] = ext
+        self.depends_on('boxart listing', self.boxart)
+
+        self.fh = self.open_output()
+        self.fh.write('<?xml version="1.0"?>\n')
+        self.fh.write('<gameList>\n')
+        return
+
+    def wants(self, rec):
+        return rec['cc3_filename'] is not None and rec['tags'] is not None
+
+    def get_image(self, rec):
+        if self.options.get('noimages') is True:
+            return None
+
+        if rec['cc3_filename'] in self.boxart.keys():
+            return f"{rec['cc3_filename']}{self.boxart[rec['cc3_filename']]}"
+
+        # maybe the variant parent?
+        if rec['variant_of'] is not None:
+            variant_rec = self.inty.get_record_from_id(rec['variant_of'])
+
+            if variant_rec is not None:
+                self.depends_on(f"{rec['id']}'s variant_of record", variant_rec['cc3_filename'])
+
+            if variant_rec is not None and variant_rec['cc3_filename'] in self.boxart.keys():
+                return f"{variant_rec['cc3_filename']}{self.boxart[variant_rec['cc3_filename']]}"
+        return None
+
+    def add(self, rec):
+        out = ["  <game>\n",
+               f"    <path>./{rec['cc3_filename'].upper()}</path>\n",
+               f"    <name>{rec['name']}</name>\n"]
+
+        image = self.get_image(rec)
+        if image is not None:
+            out.append(f'    <image>~/.emulationstation/downloaded_images/intellivision/{image}</image>\n')
+        out.append('    <players />\n')
+        out.append('  </game>\n')
+        self.fh.write(''.join(out))
+        return
+
+    def finish(self):
+        self.fh.write('</gameList>\n')
+        self.close_outputs()
+        return
+
+
+@export_target('srclist')
+class SrclistWriter(ExportWriter):
+    # list of ROM filenames (or IDs), DOS line endings unless nodos
+    default_filename = 'srclist.txt'
+    input_fields = ('id', 'cc3_filename', 'name', 'tags')
+    option_names = ('nodos', 'ids')
+
+    def start(self):
+        self.crlf = "\n" if self.options.get('nodos') is True else CRLF
+        self.ids = self.options.get('ids') is True
+        self.fh = self.open_output()
+        return
+
+    def wants(self, rec):
+        # don't list any recs without tags
+        if rec['tags'] is None:
+            return False
+        return self.ids is True or rec['cc3_filename'] is not None
+
+    def add(self, rec):
+        if self.ids is True:
+            self.fh.write(f"{rec['id']}{self.crlf}")
+        else:
+            self.fh.write(f"{rec['cc3_filename'].upper()}{self.crlf}")
+        return
+
+
+@export_target('frink')
+class FrinkWriter(ExportWriter):
+    # game list for the Frinkiac 7 arcade cabinet
+    default_filename = 'frinklist.txt'
+    input_fields = ('cc3_filename', 'name', 'year', 'author')
+
+    def start(self):
+        self.fh = self.open_output()
+        return
+
+    def add(self, rom):
+        cc3f = ""
+        if rom['cc3_filename'] is not None:
+            cc3f = rom['cc3_filename'].upper()
+
+        lines = (cc3f,
+                 rom['name'] or "",
+                 rom['year'] or "",
+                 rom['author'] or "",
+                 "",                # parent rom
+                 "",                # unknown entry
+                 "Raster",
+                 "Horizontal",
+                 "",                # controller type
+                 "Status Good",     # any value to putting real data here?
+                 "Color Good",      # any value to putting real data here?
+                 "Sound Good",      # any value to putting real data here?
+                 "")                # game type
+        self.fh.write(''.join(map(lambda x: f"{x}{CRLF}", lines)))
+        return
+
+
+@export_target('rename')
+class RenameWriter(ExportWriter):
+    # rename_roms.sh, linking the 8.3 ROM files to descriptive names on Linux-based emulation systems
+    default_filename = 'rename_roms.sh'
+    input_fields = ('cc3_filename', 'flashback_name', 'name', 'tags')
+    format_version = 2
+
+    def start(self):
+        self.fh = self.open_output()
+
+        # files that go with a ROM (the .CFG for a .BIN) get linked under the game's name too
+        self.by_base = rom_links.files_by_base(self.inty.get_roms_repository())
+        self.depends_on('repository listing', self.by_base)
+        return
+
+    def wants(self, rec):
+        return rec['cc3_filename'] is not None and rec['tags'] is not None
+
+    def add(self, rec):
+        for game_file, fname in rom_links.game_links(rec, self.by_base):
+            self.fh.write(f"rm '/home/pi/RetroPie/roms/intellivision/{game_file}' > /dev/null 2>&1\n"
+                          f"ln -s /home/pi/all_inty_roms/{fname} "
+                          f"'/home/pi/RetroPie/roms/intellivision/{game_file}'\n")
+        return
+
+
+@export_target('pi')
+class PiOptsWriter(ExportWriter):
+    # the game options DB for the Pi's emulator, as JSON
+    default_filename = 'game_opts.json'
+    input_fields = ('cc3_filename', 'name', 'options')
+
+    def start(self):
+        self.outdb = {}
+        return
+
+    def wants(self, rec):
+        return rec['cc3_filename'] is not None
+
+    def add(self, rec):
+        self.outdb[rec['cc3_filename'].upper()] = self.inty.get_game_opts(rec)
+        return
+
+    def finish(self):
+        fh = self.open_output()
+        fh.write(json.dumps(self.outdb, indent=4, sort_keys=True))
+        self.close_outputs()
+        return
+
+
+@export_target('picdb')
+class PiOptsCdbWriter(ExportWriter):
+    # the game options DB for the Pi's emulator as a cdb (see cdb.py), with kbdhackfiles and cfg files
+    default_filename = 'game_opts.cdb'
+    input_fields = ('id', 'cc3_filename', 'name', 'options', 'kbdhackfile', 'cfg_file')
+
+    def start(self):
+        self.writer = cdb.CdbWriter(self.get_output_files()[0])
+        self.cfg_owners = {}
+        self.depends_on('default kbdhackfiles', (self.inty.get_laptop_default_kbdhackfile(),
+                                                 self.inty.get_laptop_default_ecs_kbdhackfile()))
+        return
+
+    def wants(self, rec):
+        return rec['cc3_filename'] is not None
+
+    def add(self, rec):
+        fname = rec['cc3_filename'].upper()
+        opts = self.inty.get_game_opts(rec)
+        opts['kbdhackfile'] = self.inty.get_kbdhackfile(rec['id'])
+
+        if rec['cfg_file'] is not None:
+            # the cfg goes by the ROM's base name, as it does next to the ROM, so X.BIN and X.ROM can't both have one
+            opts['cfg'] = f"{os.path.splitext(fname)[0]}.CFG"
+            if opts['cfg'] in self.cfg_owners:
+                raise Exception(f"{self.cfg_owners[opts['cfg']]} and {fname} would both have their cfg stored as "
+                                f"{opts['cfg']}, give one of them a different name")
+            self.cfg_owners[opts['cfg']] = fname
+            self.writer.add(opts['cfg'], rec['cfg_file'])
+
+        self.writer.add(fname, cdb.encode_game_opts(opts))
+        return
+
+    def finish(self):
+        path = self.get_output_files()[0]
+        if self.should_write(path) is True:
+            self.writer.finish()
+            self.wrote(path)
+        else:
+            self.writer.abort()
+        return
+
+    def abort(self):
+        self.writer.abort()
+        return
+
+
+@export_target('cc3')
+class Cc3MenusWriter(ExportWriter):
+    #
+    # CC3 menu files, one per line of the menu list file (MENULIST.TXT by default).  Each menu is made of 32 byte
+    # entries (see cc3.py).  A menu collects the records (with a cc3_desc) carrying any of its tags, sorted by
+    # cc3_desc unless a <MENU>.LST file gives the order as a list of IDs.  Records are sorted into their menus as they
+    # stream past, through a tag -> menus index, and each menu is packed into one buffer that is read back with
+    # cc3.decode_cc3_data before it's written.
+    #
+    menu_fields = ('cc3_desc', 'cc3_filename', 'name')
+
+    # the tags that put a record in a menu, where they aren't just the menu's name: the main menu is really the
+    # 'game' tag and brew includes brewcart
+    menu_tag_aliases = {'MENU': ('game',),
+                        'BREW': ('brew', 'brewcart')}
+
+    def start(self):
+        self.menufile = self.options.get('menufile', 'MENULIST.TXT')
+        with open(self.menufile, 'r') as fh:
+            self.menulist = [line.rstrip('\r\n') for line in fh.readlines() if line.strip() != '']
+
+        self.menus = {}
+        self.menus_by_tag = {}
+        for line in self.menulist:
+            menu = line[:8].strip()
+            self.menus[menu] = []
+            for tag in self.menu_tag_aliases.get(menu, (menu.lower(),)):
+                self.menus_by_tag.setdefault(tag, []).append(menu)
+        return
+
+    def get_output_files(self):
+        return [self.output_path(f"{menu}.CC3") for menu in self.menus.keys()]
+
+    def get_menu_path(self, menu):
+        return self.output_path(f"{menu}.CC3")
+
+    def wants(self, rec):
+        return rec['cc3_desc'] is not None and rec['cc3_filename'] is not None and rec['tags'] is not None
+
+    def track(self, rec):
+        # each menu only depends on its own records, which add() sorts out
+        return
+
+    def add(self, rec):
+        in_menus = set()
+        for tag in rec['tags'].split(','):
+            for menu in self.menus_by_tag.get(tag, ()):
+                if menu not in in_menus:
+                    in_menus.add(menu)
+                    self.menus[menu].append(rec)
+                    self.depends_on_record(rec, self.menu_fields, self.get_menu_path(menu))
+        return
+
+    def lst_order(self, menu):
+        # a .LST file gives the order (and the contents) of a menu as a list of IDs
+        lstfile = f"{menu}.LST"
+        if os.path.isfile(lstfile) is False:
+            return None
+
+        with open(lstfile, 'r') as fh:
+            lst = fh.read()
+        self.depends_on(f"{lstfile}", lst, self.get_menu_path(menu))
+
+        recs = []
+        for line in lst.splitlines():
+            rec = self.inty.get_record_from_id(line.strip())
+            if rec is not None:
+                recs.append(rec)
+                self.depends_on_record(rec, self.menu_fields, self.get_menu_path(menu))
+        return recs
+
+    def menu_entries(self, menu):
+        entries = []
+        if menu == 'MENU':
+            # main menu is special, it gets a list of all other menus at the top
+            self.depends_on(self.menufile, self.menulist, self.get_menu_path(menu))
+            for line in self.menulist:
+                if line[0:8].strip() != 'MENU':
+                    entries.append((line[8:28], line[0:8], 'MENU'))
+        else:
+            # non-main menu list get a return to the main menu
+            entries.append(("---  Main Menu   ---", "MENU", "MENU"))
+
+        recs = self.lst_order(menu)
+        if recs is None:
+            recs = sorted(self.menus[menu], key=lambda x: x['cc3_desc'])
+
+        for rec in recs:
+            basename, ext = os.path.splitext(rec['cc3_filename'])
+            entries.append((rec['cc3_desc'], basename.upper(), ''))
+        return entries
+
+    def finish(self):
+        for menu in self.menus.keys():
+            entries = self.menu_entries(menu)
+            data = cc3.pack_cc3_entries(entries)
+            cc3.verify_cc3_data(data, entries)
+
+            fh = self.open_output(f"{menu}.CC3", binary=True)
+            fh.write(data)
+        self.close_outputs()
+        return
+
+
+def export(inty, targets, filters=None, out_dir='.', options=None, state=None):
+    #
+    # Generate the given targets in one pass over the sorted and filtered DB records.  With an ExportState, outputs
+    # whose inputs haven't changed are skipped (and the state is saved afterwards).  Returns the writers, whose
+    # decisions say what was written and why.
+    #
+    for target in targets:
+        if target not in export_targets.keys():
+            raise Exception(f"Unknown export target {target}, the targets are: {', '.join(export_targets.keys())}")
+
+    writers = []
+    try:
+        for target in targets:
+            writer = export_targets[target](inty, out_dir, options, state)
+            writers.append(writer)
+            writer.start()
+
+            settings = {'filters': filters, 'format_version': writer.format_version,
+                        'options': {k: writer.options.get(k) for k in writer.option_names}}
+            for path in writer.get_output_files():
+                writer.depends_on('filters/options', settings, path)
+
+        for rec in sorted_records(inty.get_db(), filters):
+            for writer in writers:
+                if writer.wants(rec):
+                    writer.track(rec)
+                    writer.add(rec)
+
+        for writer in writers:
+            writer.finish()
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+    finally:
+        if state is not None:
+            state.save()
+    return writers
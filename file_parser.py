@@ -2,38 +2,47 @@
 
 import sys
 import os
-import struct
 
 tool_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(tool_dir)
 
+import archive
 import checksum
 
+allowed_romfile_extensions = ('ROM', 'BIN', 'LUIGI')
+
+
+def rom_file_type_from_header(header):
+    # determine file type via the 3-byte header
+    if header[0] == 0x4C and header[1] == 0x54 and header[2] == 0x4F:
+        return 'luigi'
+    elif header[1] == (0xFF ^ header[2]):
+        return 'rom'
+    return 'bin'
+
 
 class FileParser:
     def read_binary_file_into_unsigned_ints(self, filename):
-        uint_8s = []
-        with open(filename, 'rb') as fh:
-            ch = fh.read(1)
-            while ch != b'':
-                uint_8s.append(struct.unpack('B', ch)[0])
-                ch = fh.read(1)
-        return uint_8s
+        return list(archive.read_rom_file(filename))
 
     def calc_crcs_for_file(self, filename):
-        if os.path.isfile(filename) is False:
+        # filename can be a member of a zip archive, "archive.zip!member.rom"
+        if archive.rom_file_exists(filename) is False:
             raise Exception(f"{filename} doesn't seem to be a file")
 
-        rom_file_len = os.path.getsize(filename)
-        uint_8s = self.read_binary_file_into_unsigned_ints(filename)
+        return self.calc_crcs_for_data(archive.read_rom_file(filename))
+
+    def calc_crcs_for_data(self, raw):
+        rom_file_len = len(raw)
+        uint_8s = list(raw)
 
-        # determine file type via the 3-byte header
-        if uint_8s[0] == 0x4C and uint_8s[1] == 0x54 and uint_8s[2] == 0x4F:
+        rom_file_type = rom_file_type_from_header(uint_8s)
+        if rom_file_type == 'luigi':
             from luigi_parser import LuigiParser
             parser = LuigiParser()
             data, warnings = parser.parse_luigi(uint_8s)
 
-        elif uint_8s[1] == (0xFF ^ uint_8s[2]):
+        elif rom_file_type == 'rom':
             from rom_parser import RomParser
             parser = RomParser()
             data, warnings = parser.parse_rom(uint_8s)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import errno
+import shutil
+import concurrent.futures
+
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(tool_dir)
+
+import archive
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+#
+# Moving ROM files into and out of the repository without a shell.
+#
+# A transfer tries the cheapest way of getting the bytes to the destination first: a hard link (same filesystem, no
+# data moves at all), then a reflink clone (btrfs, XFS, ... share the blocks copy-on-write), then copy_file_range
+# (the kernel copies without the data coming up to us), and finally a plain buffered copy.  Whatever the method, the
+# file is written under a temp name in the destination directory, checked against the SHA1 it's supposed to have
+# (the file_sha1 from its wash) and only then renamed into place, so the destination is never half written.
+#
+
+# _IOW(0x94, 9, int) from linux/fs.h
+FICLONE = getattr(fcntl, 'FICLONE', 0x40049409) if sys.platform.startswith('linux') else None
+
+copy_buffer_size = 1024 * 1024
+
+# the errors that mean "this method isn't available here", rather than that something is actually wrong
+unsupported_errnos = set(getattr(errno, name) for name in ('EXDEV', 'EPERM', 'EACCES', 'EMLINK', 'ENOTSUP',
+                                                           'EOPNOTSUPP', 'EINVAL', 'ENOSYS', 'ENOTTY')
+                         if hasattr(errno, name))
+
+
+def try_hardlink(src, temp_file):
+    os.link(src, temp_file)
+    return 'hardlink'
+
+
+def try_reflink(src, temp_file):
+    if FICLONE is None:
+        raise OSError(errno.ENOTSUP, "reflinks aren't supported here")
+
+    with open(src, 'rb') as fsrc, open(temp_file, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        os.fsync(fdst.fileno())
+    return 'reflink'
+
+
+def try_copy_file_range(src, temp_file):
+    if hasattr(os, 'copy_file_range') is False:
+        raise OSError(errno.ENOSYS, "copy_file_range isn't supported here")
+
+    with open(src, 'rb') as fsrc, open(temp_file, 'wb') as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if n == 0:
+                break
+            remaining -= n
+        os.fsync(fdst.fileno())
+
+    # nothing more came back before the end of the file (it shrank, or the filesystem only copies so much this
+    # way), so copy it the ordinary way rather than leave a short file
+    if remaining > 0:
+        return try_copy(src, temp_file)
+    return 'copy_file_range'
+
+
+def try_copy(src, temp_file):
+    with open(src, 'rb') as fsrc, open(temp_file, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst, copy_buffer_size)
+        fdst.flush()
+        os.fsync(fdst.fileno())
+    return 'copy'
+
+
+def try_extract(src, temp_file):
+    with archive.open_rom_file(src) as fsrc, open(temp_file, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst, copy_buffer_size)
+        fdst.flush()
+        os.fsync(fdst.fileno())
+    return 'extract'
+
+
+def transfer_file(src, dest, sha1=None, hardlink=True):
+    #
+    # Put a copy of src at dest and return how it was done ('hardlink', 'reflink', 'copy_file_range' or 'copy', or
+    # 'extract' when src is a member of a zip archive).
+    # With sha1, the new file has to hash to it or nothing is left behind and an Exception is raised.  Hard links
+    # share the file with src, so leave them out (hardlink=False) when either copy might be edited in place.
+    #
+    methods = [try_reflink, try_copy_file_range, try_copy]
+    if hardlink is True:
+        methods.insert(0, try_hardlink)
+    if archive.split_member_name(src) is not None:
+        methods = [try_extract]
+
+    temp_file = os.path.join(os.path.dirname(os.path.abspath(dest)), f".{os.path.basename(dest)}.tmp.{os.getpid()}")
+    try:
+        for method in methods:
+            if os.path.lexists(temp_file):
+                os.remove(temp_file)
+            try:
+                how = method(src, temp_file)
+                break
+            except OSError as errmsg:
+                if errmsg.errno not in unsupported_errnos or method is methods[-1]:
+                    raise
+
+        if sha1 is not None and archive.file_sha1(temp_file) != sha1.lower():
+            raise Exception(f"{src} doesn't match its fingerprint, not copied to {dest}")
+        os.replace(temp_file, dest)
+    except BaseException:
+        if os.path.lexists(temp_file):
+            os.remove(temp_file)
+        raise
+    return how
+
+
+def transfer_files(jobs, workers=None, hardlink=True):
+    #
+    # Generator running transfer_file for each (src, dest, sha1) in jobs, workers at a time, yielding
+    # (src, dest, how, errmsg) as each one finishes.  how is None and errmsg says why if it failed.
+    #
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(transfer_file, src, dest, sha1, hardlink): (src, dest) for src, dest, sha1 in jobs}
+        for future in concurrent.futures.as_completed(futures):
+            src, dest = futures[future]
+            try:
+                yield (src, dest, future.result(), None)
+            except Exception as errmsg:
+                yield (src, dest, None, str(errmsg))
+    return
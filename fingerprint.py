@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import zlib
+import json
+import shutil
+import hashlib
+import tempfile
+import multiprocessing
+import concurrent.futures
+
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(tool_dir)
+
+import shell
+import archive
+import checksum
+from file_parser import FileParser
+
+syswart = "linux"
+if sys.platform == "darwin":
+    syswart = "macos"
+
+bin2rom = f"{tool_dir}/bin2rom_{syswart}"
+rom2bin = f"{tool_dir}/rom2bin_{syswart}"
+bin2luigi = f"{tool_dir}/bin2luigi_{syswart}"
+luigi2bin = f"{tool_dir}/luigi2bin_{syswart}"
+
+
+def wash_rom_file(filename, temp_dir='/tmp'):
+    #
+    # "wash" a romfile
+    #
+    # Basically, calculate the CRCs for the given file and if it is a non-bin convert to bin and calculate CRCs
+    # for the result.
+    #
+    # Each wash gets its own scratch directory for the converters, so any number of these can run at once.  The
+    # file is read once, and can be a member of a zip archive ("archive.zip!member.rom"); only the converters ever
+    # see a copy of it on disk, in the scratch directory.
+    #
+    if archive.rom_file_exists(filename) is False:
+        raise Exception(f"{filename} doesn't seem to be a file")
+    raw = archive.read_rom_file(filename)
+
+    parser = FileParser()
+    origcrcdata, origwarnings = parser.calc_crcs_for_data(raw)
+
+    # TODO: check warnings
+
+    output = {}
+    output['rom_file_type'] = origcrcdata['rom_file_type']
+    output['file_size'] = len(raw)
+    output['file_sha1'] = hashlib.sha1(raw).hexdigest()
+
+    scratch_dir = tempfile.mkdtemp(prefix='inty_wash.', dir=temp_dir)
+    try:
+        if origcrcdata['rom_file_type'] == 'bin':
+            # I used to convert bin files to roms and get CRCs for the converted roms.  I'm no longer convinced
+            # that is a good idea
+            output['bin_cowering_crc32'] = f"{zlib.crc32(raw):08X}"
+            output['bincrcdata'] = origcrcdata
+
+        elif origcrcdata['rom_file_type'] == 'rom':
+            # convert rom to bin to get CRCs
+            with open(f'{scratch_dir}/xxx.rom', 'wb') as fhw:
+                fhw.write(raw)
+            shell.exc(f"cd {scratch_dir} ; {rom2bin} xxx.rom > /dev/null")
+
+            bincrcdata, warnings = parser.calc_crcs_for_file(f'{scratch_dir}/xxx.bin')
+
+            # TODO: check warnings
+
+            binfile = f'{scratch_dir}/xxx.bin'
+            output['bin_cowering_crc32'] = f"{checksum.cowering_crc32_from_file(binfile):08X}"
+            output['bincrcdata'] = bincrcdata
+            output['romcrcdata'] = origcrcdata
+
+        elif origcrcdata['rom_file_type'] == 'luigi':
+            output['luigicrcdata'] = origcrcdata
+
+            # luigis can be encrypted (indeed, all mine are) and so there is only so much data we can get
+            try:
+                enc = output['luigicrcdata']['luigi_meta']['encrypted']
+            except Exception:
+                enc = False
+
+            if enc is False:
+                with open(f'{scratch_dir}/xxx.luigi', 'wb') as fhw:
+                    fhw.write(raw)
+                shell.exc(f"cd {scratch_dir} ; {luigi2bin} xxx.luigi > /dev/null")
+
+                bincrcdata, warnings = parser.calc_crcs_for_file(f'{scratch_dir}/xxx.bin')
+
+                # TODO: check warnings
+
+                binfile = f'{scratch_dir}/xxx.bin'
+                output['bin_cowering_crc32'] = f"{checksum.cowering_crc32_from_file(binfile):08X}"
+                output['bincrcdata'] = bincrcdata
+
+        else:
+            raise Exception(f"romfile parsing came up with invalid rom file type: {origcrcdata['rom_file_type']}")
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return output
+
+
+def record_fields_from_wash(wash):
+    # map the pieces of a wash onto the DB record fields they correspond to
+    fields = {}
+    for section, keys in (('bincrcdata', ('bin_md5', 'bin_crc32')),
+                          ('romcrcdata', ('rom_data_md5', 'rom_attr_md5', 'rom_data_crc16s', 'rom_attr_crc16')),
+                          ('luigicrcdata', ('luigi_crc32s',))):
+        if section in wash.keys():
+            for k in keys:
+                if k in wash[section].keys():
+                    fields[k] = wash[section][k]
+
+    if 'bin_cowering_crc32' in wash.keys():
+        fields['cowering_crc32'] = wash['bin_cowering_crc32']
+    return fields
+
+
+class FingerprintCache:
+    # Persistent cache of washes, keyed by absolute filename.  An entry is only used while the file's size and
+    # mtime are the same as when it was washed.
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.entries = {}
+        self.dirty = False
+
+        if os.path.isfile(cache_file):
+            try:
+                with open(cache_file, 'r') as fh:
+                    self.entries = json.load(fh)
+            except Exception:
+                # a damaged cache is just an empty cache
+                self.entries = {}
+        return
+
+    def get(self, filename):
+        entry = self.entries.get(os.path.abspath(filename))
+        if entry is None:
+            return None
+
+        try:
+            st = archive.source_stat(filename)
+        except OSError:
+            return None
+
+        if entry['size'] != st.st_size or entry['mtime_ns'] != st.st_mtime_ns:
+            return None
+        return entry['wash']
+
+    def put(self, filename, wash):
+        st = archive.source_stat(filename)
+        self.entries[os.path.abspath(filename)] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'wash': wash}
+        self.dirty = True
+        return
+
+    def save(self):
+        if self.dirty is False:
+            return
+
+        temp_file = f"{self.cache_file}.tmp.{os.getpid()}"
+        with open(temp_file, 'w') as fh:
+            json.dump(self.entries, fh)
+        os.replace(temp_file, self.cache_file)
+        self.dirty = False
+        return
+
+
+def wash_mp_context():
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+class WashPool:
+    #
+    # Washes files in a pool of worker processes with never more than max_pending of them in flight, so feeding it
+    # any number of files doesn't take any more memory.  Results are lists of (filename, wash, errmsg) for the
+    # washes that have finished, and go into the cache (if there is one) as they come in.
+    #
+    # The workers are started by a forkserver (or spawned where there isn't one) rather than forked, since the pool
+    # can be started from a thread (checkdb runs its file checks in one) and forking a process with other threads
+    # running can leave a worker stuck on a lock one of them held.
+    #
+    def __init__(self, cache=None, workers=None, temp_dir='/tmp', max_pending=None):
+        self.cache = cache
+        self.workers = workers or os.cpu_count() or 1
+        self.temp_dir = temp_dir
+        self.max_pending = max_pending or self.workers * 4
+        self.pool = None
+        self.futures = {}
+        return
+
+    def submit(self, filename):
+        # queue a wash, waiting for (and returning) at least one finished one if the pool is full
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=wash_mp_context())
+        self.futures[self.pool.submit(wash_rom_file, filename, self.temp_dir)] = filename
+
+        if len(self.futures) < self.max_pending:
+            return self.finished(block=False)
+        return self.finished(block=True)
+
+    def finished(self, block=False):
+        if len(self.futures) == 0:
+            return []
+
+        done, not_done = concurrent.futures.wait(self.futures.keys(), timeout=None if block is True else 0,
+                                                 return_when=concurrent.futures.FIRST_COMPLETED)
+        return [self.result(future) for future in done]
+
+    def result(self, future):
+        filename = self.futures.pop(future)
+        try:
+            wash = future.result()
+        except Exception as errmsg:
+            return (filename, None, str(errmsg))
+
+        if self.cache is not None:
+            self.cache.put(filename, wash)
+        return (filename, wash, None)
+
+    def drain(self):
+        # generator over the rest of the washes as they finish
+        while len(self.futures) > 0:
+            for result in self.finished(block=True):
+                yield result
+        return
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+        self.futures = {}
+        if self.cache is not None:
+            self.cache.save()
+        return
+
+
+def fingerprint_files(filenames, cache=None, workers=None, temp_dir='/tmp', max_pending=None):
+    # Generator yielding (filename, wash, errmsg) for each file, in the order the results become available.  Cached
+    # washes come straight back, everything else is washed in a WashPool.  filenames can be a generator, it's only
+    # read as fast as the washes keep up.
+    pool = WashPool(cache, workers, temp_dir, max_pending)
+    try:
+        for filename in filenames:
+            wash = None
+            if cache is not None:
+                wash = cache.get(filename)
+
+            if wash is not None:
+                yield (filename, wash, None)
+                continue
+
+            for result in pool.submit(filename):
+                yield result
+
+        for result in pool.drain():
+            yield result
+    finally:
+        pool.close()
+    return
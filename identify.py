@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import zlib
+import hashlib
+import zipfile
+import concurrent.futures
+
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(tool_dir)
+
+import archive
+import fingerprint
+from file_parser import rom_file_type_from_header
+
+
+def quick_hash_file(filename):
+    #
+    # One streaming pass over a file for everything a reference DAT lookup needs: the file type from its header,
+    # its size, IEEE CRC32 (which is Cowering's CRC for a bin) and SHA1.  Nothing gets parsed or converted.  A
+    # member of a zip archive is streamed straight out of it.
+    #
+    crc = 0
+    sha1 = hashlib.sha1()
+    size = 0
+    rom_file_type = None
+    with archive.open_rom_file(filename) as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            if rom_file_type is None:
+                rom_file_type = rom_file_type_from_header(chunk) if len(chunk) >= 3 else 'bin'
+            crc = zlib.crc32(chunk, crc)
+            sha1.update(chunk)
+            size += len(chunk)
+
+    return {'rom_file_type': rom_file_type or 'bin', 'file_size': size, 'file_sha1': sha1.hexdigest(),
+            'bin_cowering_crc32': f"{crc:08X}"}
+
+
+def identify_files(filenames, refs, cache=None, workers=None, temp_dir='/tmp', max_pending=None):
+    #
+    # Generator yielding (filename, crc, ref, errmsg) for each file, where ref is what refs.lookup_wash found (or
+    # None), in the order the results become available.  Files with a cached wash come back straight away.
+    # Everything else is hashed by quick_hash_file in a pool of threads (zlib and hashlib let go of the GIL while
+    # they work), and that's all a bin needs; roms and luigis have to go through the converters to get a bin CRC,
+    # so they're handed on to a WashPool.  filenames can be a generator, it's only read as fast as the hashing and
+    # the washes keep up.
+    #
+    def identified(filename, wash, errmsg):
+        if wash is None:
+            return (filename, None, None, errmsg)
+        # encrypted luigis can't be converted, so they never have a bin CRC
+        return (filename, wash.get('bin_cowering_crc32'), refs.lookup_wash(wash), None)
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    hashing = {}
+
+    def hashed(done):
+        # results for finished quick hashes, passing the roms and luigis on to the WashPool
+        out = []
+        for future in done:
+            filename = hashing.pop(future)
+            try:
+                wash = future.result()
+            except (OSError, zipfile.BadZipFile, KeyError) as errmsg:
+                out.append((filename, None, None, str(errmsg)))
+                continue
+
+            if wash['rom_file_type'] == 'bin':
+                out.append(identified(filename, wash, None))
+            else:
+                out.extend(identified(*result) for result in pool.submit(filename))
+        return out
+
+    pool = fingerprint.WashPool(cache, workers, temp_dir, max_pending)
+    hash_pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    try:
+        for filename in filenames:
+            wash = cache.get(filename) if cache is not None else None
+            if wash is not None:
+                yield identified(filename, wash, None)
+                continue
+
+            hashing[hash_pool.submit(quick_hash_file, filename)] = filename
+            done, not_done = concurrent.futures.wait(hashing.keys(), timeout=None if len(hashing) >= max_pending else 0,
+                                                     return_when=concurrent.futures.FIRST_COMPLETED)
+            for result in hashed(done):
+                yield result
+
+            for result in pool.finished(block=False):
+                yield identified(*result)
+
+        while len(hashing) > 0:
+            done, not_done = concurrent.futures.wait(hashing.keys(), return_when=concurrent.futures.FIRST_COMPLETED)
+            for result in hashed(done):
+                yield result
+
+        for result in pool.drain():
+            yield identified(*result)
+    finally:
+        hash_pool.shutdown(wait=True, cancel_futures=True)
+        pool.close()
+    return
@@ -48,6 +48,8 @@ import sys
 import os
 import re
 import json
+import shlex
+import bisect
 import argparse
 import subprocess
 
@@ -55,25 +57,25 @@ tool_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(tool_dir)
 
 import cowering
-import shell
+import ref_index
+import identify
 import cc3
 import checksum
-from file_parser import FileParser
+import fingerprint
+import server
+import exporter
+import rom_sync
+import rom_links
+import file_transfer
+import repo_manifest
+import archive
+import rom_scan
+from file_parser import FileParser, allowed_romfile_extensions
 from db_parser import DbParser
+from db_checks import DbChecker
 
 CRLF = f"{chr(13)}{chr(10)}"
 
-syswart = "linux"
-if sys.platform == "darwin":
-    syswart = "macos"
-
-bin2rom = f"{tool_dir}/bin2rom_{syswart}"
-rom2bin = f"{tool_dir}/rom2bin_{syswart}"
-bin2luigi = f"{tool_dir}/bin2luigi_{syswart}"
-luigi2bin = f"{tool_dir}/luigi2bin_{syswart}"
-
-allowed_romfile_extensions = ('ROM', 'BIN', 'LUIGI')
-
 
 ################################################################################
 #
@@ -86,6 +88,8 @@ allowed_romfile_extensions = ('ROM', 'BIN', 'LUIGI')
 
 hmsg = "My CLI tool for managing my Intellivision ROMs collection"
 cli = argparse.ArgumentParser(description=hmsg)
+cli.add_argument("--server", help="Send command line API queries to the 'inty serve' daemon on this socket, if it's "
+                 "running.")
 subparsers = cli.add_subparsers(dest="subcommand")
 
 
@@ -125,8 +129,9 @@ def subcommand(args=[], parent=subparsers):
 ################################################################################
 
 
-class IntellivisionRomsDB:
-    def __init__(self):
+class IntellivisionRomsDB(DbParser):
+    def __init__(self, writable=False, load_db=True):
+        super().__init__()
         self.inty_tool_dir = tool_dir
         self.cowering_file = f'{tool_dir}/inty_203.dat'
         self.inty_data_file = f'{tool_dir}/inty_data.dat'
@@ -138,21 +143,67 @@ class IntellivisionRomsDB:
         self.laptop_default_ecs_kbdhackfile = 'basic'
         self.frinkiac7_default_kbdhackfile = 'basic'
         self.temp_dir = '/tmp'
+        self.fingerprint_cache_file = f'{tool_dir}/fingerprint_cache.json'
+        self.checkdb_state_file = f'{tool_dir}/checkdb_state.json'
+        self.export_state_file = f'{tool_dir}/export_state.json'
+        self.cowering_index_file = f'{tool_dir}/cowering_index.json'
+        self.repository_manifest_file = f'{tool_dir}/repository_manifest.json'
+
+        # reference DATs (No-Intro, TOSEC, ...) besides Cowering's.  When DATs disagree, the first matching pattern
+        # in reference_dat_priority wins; DATs not matching any pattern come last.
+        self.reference_dat_dir = f'{tool_dir}/dats'
+        self.reference_dat_priority = ('inty_203.dat', '*No-Intro*', '*TOSEC*')
+        self.reference_index_file = f'{tool_dir}/reference_index.json'
         self.dirty = False
+        self.writable = writable
         self.number_of_backups_to_keep = 9
 
-        dbparser = DbParser()
-        self.db, self.db_header = dbparser.read_inty_data_file(self.inty_data_file)
-        self.cowering_data = cowering.read_cowering_data(self.cowering_file)
+        # commands that only need the settings and the reference data can skip reading the DB
+        self.db = []
+        self.db_header = ''
+        if load_db is True:
+            self.db, self.db_header = self.read_inty_data_file(self.inty_data_file)
+
+        # the Cowering data is only loaded by the commands that use it
+        self.cowering_index = None
+        self.cowering_data = None
+        self.reference_index = None
+        self.repository_manifest = None
         return
 
-    def __del__(self):
+    @classmethod
+    def open(cls, write=False):
+        # Open a DB session for use as a context manager:
+        #
+        #     with IntellivisionRomsDB.open(write=True) as inty:
+        #         inty.add_rom(rec1)
+        #         inty.replace_rom(rec2)
+        #
+        # Nothing is written while the session is open.  All changes go to disk in one atomic write when the with
+        # block exits cleanly (or when commit() is called explicitly).  If the block raises, the changes are dropped.
+        return cls(writable=write)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None and self.writable is True:
+            self.commit()
+        return False
+
+    def commit(self):
+        if self.writable is False:
+            raise Exception("Cannot commit, the DB was not opened for writing")
+
         if self.dirty is True:
-            dbparser = DbParser()
-            dbparser.write_inty_data_file()
+            self.write_inty_data_file()
+            self.dirty = False
         return
 
     def set_dirty(self):
+        # records may have been changed in place, so nothing cached can be trusted - rewrite everything
+        self.record_texts = {}
+        self.field_indexes = {}
         self.dirty = True
         return
 
@@ -174,9 +225,42 @@ class IntellivisionRomsDB:
     def get_boxart_repository(self):
         return self.boxart_repository
 
+    def get_cowering_index(self):
+        # CRC (as an int) -> (good_name, size)
+        if self.cowering_index is None:
+            self.cowering_index = cowering.load_cowering_index(self.cowering_file, self.cowering_index_file)
+        return self.cowering_index
+
     def get_cowering_data(self):
+        # zero padded, lower case CRC string -> good_name
+        if self.cowering_data is None:
+            self.cowering_data = {f"{crc:08x}": v[0] for crc, v in self.get_cowering_index().items()}
         return self.cowering_data
 
+    def get_cowering_entry(self, crc):
+        # look up a CRC given as an int or a hex string of either case.  Returns (good_name, size) or None.
+        if isinstance(crc, str):
+            try:
+                crc = int(crc, 16)
+            except ValueError:
+                return None
+        return self.get_cowering_index().get(crc)
+
+    def get_reference_index(self):
+        # merged index of Cowering's DAT plus everything in the reference DAT directory
+        if self.reference_index is None:
+            dat_files = [self.cowering_file] + ref_index.find_dat_files(self.reference_dat_dir)
+            self.reference_index = ref_index.ReferenceIndex(dat_files, self.reference_dat_priority,
+                                                            self.reference_index_file)
+        return self.reference_index
+
+    def get_repository_manifest(self):
+        # filename -> (size, mtime_ns, sha1) for everything in the ROM repository, and which files have a given SHA1
+        if self.repository_manifest is None:
+            self.repository_manifest = repo_manifest.RepositoryManifest(self.roms_repository,
+                                                                        self.repository_manifest_file)
+        return self.repository_manifest
+
     def get_temp_dir(self):
         return self.temp_dir
 
@@ -256,22 +340,25 @@ class IntellivisionRomsDB:
         all_tags_list = sorted(list(all_tags))
         return list(all_tags_list)
 
+    def get_game_opts(self, rec):
+        nrec = {'voice': False,
+                'ecs': False,
+                'jlp': False,
+                'tutorvision': False}
+
+        for okey in nrec.keys():
+            if okey in str(rec['options']).lower():
+                nrec[okey] = True
+        return nrec
+
     def dump_game_opts_db_for_emulator(self, outfile):
-        outdb = {}
-        for rec in self.db:
-            nrec = {'voice': False,
-                    'ecs': False,
-                    'jlp': False,
-                    'tutorvision': False}
-
-            for okey in nrec.keys():
-                if okey in str(rec['options']).lower():
-                    nrec[okey] = True
-            if rec['cc3_filename'] is not None:
-                outdb[rec['cc3_filename'].upper()] = nrec
+        exporter.export(self, ['pi'], options={'pi_file': outfile})
+        return
 
-        with open(outfile, 'w') as fh:
-            fh.write(json.dumps(outdb, indent=4, sort_keys=True))
+    def dump_game_opts_cdb_for_emulator(self, outfile):
+        # same as dump_game_opts_db_for_emulator, plus the kbdhackfile and cfg file, as a cdb (see cdb.py) so the
+        # launcher can look up a single game without reading the rest
+        exporter.export(self, ['picdb'], options={'picdb_file': outfile})
         return
 
     def get_all_ids(self, field=None):
@@ -289,39 +376,34 @@ class IntellivisionRomsDB:
         if field == 'cc3_filename':
             value = value.lower()
 
-        for rec_idx in range(0, len(self.db)):
-            rec = self.db[rec_idx]
-            found = False
-
-            if ',' in value:
-                # this is a list comparison
-                values_list = sorted(value.split(','))
-
-                if ',' not in rec[field]:
-                    continue
+        if ',' not in value:
+            # simple scalar value - look it up in the field's index (value -> first record with that value)
+            index = self.field_indexes.get(field)
+            if index is None:
+                index = {}
+                for rec_idx in range(len(self.db) - 1, -1, -1):
+                    index[self.db[rec_idx].get(field)] = rec_idx
+                self.field_indexes[field] = index
+            return index.get(value)
 
-                rec_values_list = sorted(rec[field].split(','))
+        # this is a list comparison
+        values_list = sorted(value.split(','))
 
-                if len(rec_values_list) != len(values_list):
-                    continue
-
-                found = True
-                for i in range(0, len(values_list)):
-                    if values_list[i] != rec_values_list[i]:
-                        found = False
-                        break
+        for rec_idx in range(0, len(self.db)):
+            rec = self.db[rec_idx]
 
-            else:
-                # simple scalar value
-                if rec[field] == value:
-                    found = True
+            if rec.get(field) is None or ',' not in rec[field]:
+                continue
 
-            if found is True:
+            if sorted(rec[field].split(',')) == values_list:
                 return rec_idx
         return None
 
+    def get_record_index_from_id(self, name):
+        return self.get_record_index_from_FIELD('id', name)
+
     def get_record_from_FIELD(self, field, value):
-        idx = self.get_record_index_from_FIELD(field, value):
+        idx = self.get_record_index_from_FIELD(field, value)
         if idx is None:
             return None
         return self.db[idx]
@@ -413,6 +495,101 @@ class IntellivisionRomsDB:
             raise Exception(f"Bad rom file type: {wash['rom_file_type']}")
         return (None, 'NOT FOUND')
 
+    def get_rom_file(self, game_id):
+        rec = self.get_record_from_id(game_id)
+        if rec is None:
+            return None
+        return rec['cc3_filename']
+
+    def get_options(self, game_id):
+        rec = self.get_record_from_id(game_id)
+        if rec is None or rec['options'] is None:
+            return []
+        return rec['options'].split(',')
+
+    def get_kbdhackfile(self, game_id):
+        hack = self.get_laptop_default_kbdhackfile()
+
+        # special hack case for CGC
+        if game_id == 'cgc':
+            hack = 'laptop-cgc'
+        else:
+            rec = self.get_record_from_id(game_id)
+            if rec is not None:
+                if rec['options'] is not None:
+                    if 'ecs' in rec['options'].split(','):
+                        hack = self.get_laptop_default_ecs_kbdhackfile()
+                if rec['kbdhackfile'] is not None:
+                    hack = rec['kbdhackfile']
+        return hack
+
+    def get_id_from_rom_file(self, romfile):
+        rec = self.get_record_from_cc3filename(romfile)
+        if rec is None:
+            return None
+        return rec['id']
+
+    def get_launch_info(self, key):
+        # everything a front end needs to start a game, given its ID or cc3_filename
+        rec = self.get_record_from_id(key)
+        if rec is None:
+            rec = self.get_record_from_cc3filename(key)
+        if rec is None:
+            return None
+
+        rep = self.get_roms_repository()
+        info = {'id': rec['id'], 'name': rec['name'], 'rom_dir': rep, 'rom_file': None, 'rom_path': None,
+                'options': self.get_options(rec['id']), 'kbdhackfile': self.get_kbdhackfile(rec['id']),
+                'kbdhackfile_dir': self.get_kbdhackfile_dir(), 'cfg_path': None, 'cfg': rec['cfg_file']}
+
+        # the repository holds the files with upper case names, the cfg file (if any) next to the ROM
+        if rec['cc3_filename'] is not None:
+            fname = rec['cc3_filename'].upper()
+            info['rom_file'] = fname
+            info['rom_path'] = f"{rep}/{fname}"
+
+            cfg_path = f"{rep}/{os.path.splitext(fname)[0]}.CFG"
+            if os.path.isfile(cfg_path):
+                info['cfg_path'] = cfg_path
+        return info
+
+    def lookup_record(self, *terms):
+        # terms are field=value strings, and the record has to match all of them
+        query = {}
+        for term in terms:
+            if '=' not in term:
+                raise Exception(f"Lookup terms look like field=value, not {term}")
+            field, value = term.split('=', 1)
+            if field not in self.fields_order:
+                raise Exception(f"Unknown field: {field}")
+            query[field] = value
+
+        if len(query) == 1:
+            return self.get_record_from_FIELD(field, value)
+        return self.get_record_from_FIELDS(query)
+
+    def query(self, cmd, args):
+        # the read-only lookups of the command line API, by subcommand name.  This is what "inty serve" answers.
+        queries = {'rom_dir': (self.get_roms_repository, 0),
+                   'kbdhackfiledir': (self.get_kbdhackfile_dir, 0),
+                   'rom_file': (self.get_rom_file, 1),
+                   'options': (self.get_options, 1),
+                   'kbdhackfile': (self.get_kbdhackfile, 1),
+                   'name_from_rom_file': (self.get_id_from_rom_file, 1),
+                   'launchinfo': (self.get_launch_info, 1),
+                   'lookup': (self.lookup_record, None)}
+
+        if cmd not in queries.keys():
+            raise Exception(f"Unknown query: {cmd}")
+
+        # nargs of None means one or more
+        func, nargs = queries[cmd]
+        if nargs is None and len(args) == 0:
+            raise Exception(f"{cmd} needs at least one argument")
+        if nargs is not None and len(args) != nargs:
+            raise Exception(f"{cmd} takes {nargs} argument(s), got {len(args)}")
+        return func(*args)
+
     def validate_record(self, rec):
         # this method is designed to be called after a user edit of a record
 
@@ -433,9 +610,7 @@ class IntellivisionRomsDB:
             if "." not in rec['cc3_filename']:
                 statuses.append("ROM filename doesn't have an extension!")
 
-            romfile = f"{self.roms_repository}/{rec['cc3_filename'].upper()}"
-
-            if os.path.isfile(romfile):
+            if self.rom_file_exists_in_repository(rec['cc3_filename'].upper()):
                 statuses.append('ROM in repository')
             else:
                 statuses.append('no ROM in repository')
@@ -447,18 +622,64 @@ class IntellivisionRomsDB:
         return statuses
 
     def rom_file_exists_in_repository(self, romname):
-        return os.path.isfile(f'{self.roms_repository}/{romname}')
+        return self.get_repository_manifest().exists(romname)
 
-    def copy_rom_file_to_repository(self, src, dest, force=False):
-        if os.path.isfile(f"{self.roms_repository}/{dest}") is False or force is True:
-            shell.exc(f'cp {src} {self.roms_repository}/{dest}')
-        else:
+    def find_rom_content_in_repository(self, sha1, exclude=None):
+        # the repository files that already hold this content (other than exclude)
+        return [name for name in self.get_repository_manifest().find_by_sha1(sha1) if name != exclude]
+
+    def check_copy_to_repository(self, dest, sha1, force=False):
+        if self.rom_file_exists_in_repository(dest) is True and force is False:
             raise Exception("Cannot copy file, target exists.")
+
+        if sha1 is not None:
+            same = self.find_rom_content_in_repository(sha1, dest)
+            if len(same) > 0:
+                raise Exception(f"The same file is already in the repository as {', '.join(same)}.")
+        return
+
+    def copy_rom_file_to_repository(self, src, dest, force=False, sha1=None):
+        # sha1 is the file_sha1 from src's wash, which the copy has to match
+        self.check_copy_to_repository(dest, sha1, force)
+        file_transfer.transfer_file(src, f"{self.roms_repository}/{dest}", sha1)
+
+        manifest = self.get_repository_manifest()
+        manifest.add_file(dest, sha1)
+        manifest.save()
+        return
+
+    def copy_rom_files_to_repository(self, jobs, workers=None):
+        # jobs are (src, dest, sha1) - yields (src, dest, errmsg) as each finishes, errmsg None if it was copied
+        manifest = self.get_repository_manifest()
+        pending = []
+        queued = {}
+        for src, dest, sha1 in jobs:
+            try:
+                self.check_copy_to_repository(dest, sha1)
+                if sha1 is not None and sha1 in queued:
+                    raise Exception(f"The same file is already being copied as {queued[sha1]}.")
+            except Exception as errmsg:
+                yield (src, dest, str(errmsg))
+                continue
+
+            queued[sha1] = dest
+            pending.append((src, f"{self.roms_repository}/{dest}", sha1))
+
+        sha1s = {path: sha1 for src, path, sha1 in pending}
+        try:
+            for src, path, how, errmsg in file_transfer.transfer_files(pending, workers):
+                dest = os.path.basename(path)
+                if errmsg is None:
+                    manifest.add_file(dest, sha1s[path])
+                yield (src, dest, errmsg)
+        finally:
+            manifest.save()
         return
 
     def copy_rom_file_from_repository(self, romfile, force=False):
+        # never a hard link, the local copy is there to be played with
         if os.path.isfile(romfile) is False or force is True:
-            shell.exc(f'cp {self.roms_repository}/{romfile} .')
+            file_transfer.transfer_file(f"{self.roms_repository}/{romfile}", romfile, hardlink=False)
         else:
             raise Exception("Cannot copy file, target exists.")
         return
@@ -469,6 +690,9 @@ class IntellivisionRomsDB:
                 raise Exception("Cannot add rom, already in the DB")
 
         self.db.append(rec)
+        self.field_indexes = {}
+        bisect.insort(self.sorted_ids, rec['id'])
+        self.dirty_ids.add(rec['id'])
         self.dirty = True
         return
 
@@ -497,6 +721,14 @@ class IntellivisionRomsDB:
             raise Exception(f"Didn't find record for replacement, ID:{findid}")
 
         self.db[rom_index] = new_rec
+        self.field_indexes = {}
+
+        if new_rec['id'] != findid:
+            del self.sorted_ids[bisect.bisect_left(self.sorted_ids, findid)]
+            bisect.insort(self.sorted_ids, new_rec['id'])
+            self.record_texts.pop(findid, None)
+
+        self.dirty_ids.add(new_rec['id'])
         self.dirty = True
         return
 
@@ -508,68 +740,7 @@ class IntellivisionRomsDB:
         return
 
     def wash_rom(self, filename):
-        #
-        # "wash" a romfile
-        #
-        # Basically, calculate the CRCs for the given file and if it is a non-bin convert to bin and calculate CRCs
-        # for the result.
-        #
-        parser = FileParser()
-        origcrcdata, origwarnings = parser.calc_crcs_for_file(filename)
-
-        # TODO: check warnings
-
-        shell.exc(f"rm -f {self.temp_dir}/xxx.bin {self.temp_dir}/xxx.cfg {self.temp_dir}/xxx.rom "
-                  f"{self.temp_dir}/xxx.luigi > /dev/null")
-
-        filename.replace("'", "\'")
-        basename, ext = os.path.splitext(filename)
-        output = {}
-        output['rom_file_type'] = origcrcdata['rom_file_type']
-
-        if origcrcdata['rom_file_type'] == 'bin':
-            # I used to convert bin files to roms and get CRCs for the converted roms.  I'm no longer convinced
-            # that is a good idea
-            pass
-
-        elif origcrcdata['rom_file_type'] == 'rom':
-            # convert rom to bin to get CRCs
-            shell.exc(f"cp '{filename}' {self.temp_dir}/xxx.rom")
-            shell.exc(f"cd {self.temp_dir} ; {rom2bin} xxx.rom > /dev/null")
-
-            bincrcdata, warnings = parser.calc_crcs_for_file(f'{self.temp_dir}/xxx.bin')
-
-            # TODO: check warnings
-
-            binfile = f'{self.temp_dir}/xxx.bin'
-            output['bin_cowering_crc32'] = f"{checksum.cowering_crc32_from_file(binfile):08X}"
-            output['bincrcdata'] = bincrcdata
-            output['romcrcdata'] = origcrcdata
-
-        elif origcrcdata['rom_file_type'] == 'luigi':
-            output['luigicrcdata'] = origcrcdata
-
-            # luigis can be encrypted (indeed, all mine are) and so there is only so much data we can get
-            try:
-                enc = output['luigicrcdata']['luigi_meta']['encrypted']
-            except Exception:
-                enc = False
-
-            if enc is False:
-                shell.exc(f"cp '{filename}' {self.temp_dir}/xxx.luigi")
-                shell.exc(f"cd {self.temp_dir} ; {luigi2bin} xxx.luigi > /dev/null")
-
-                bincrcdata, warnings = parser.calc_crcs_for_file(f'{self.temp_dir}/xxx.bin')
-
-                # TODO: check warnings
-
-                binfile = f'{self.temp_dir}/xxx.bin'
-                output['bin_cowering_crc32'] = f"{checksum.cowering_crc32_from_file(binfile):08X}"
-                output['bincrcdata'] = bincrcdata
-
-        else:
-            raise Exception(f"romfile parsing came up with invalid rom file type: {origcrcdata['rom_file_type']}")
-        return output
+        return fingerprint.wash_rom_file(filename, self.temp_dir)
 
     def banner(self, msg):
         maxlen = 0
@@ -581,247 +752,9 @@ class IntellivisionRomsDB:
         print(f"\n{bannerstr}\n {msg}\n{bannerstr}\n")
         return
 
-    def verify_data(self, level=1, menufile=None):
-        #
-        #  First set of checks: consistency within the DB itself
-        #
-        self.banner("Checking for repeated game data and repeated ROMs in the DB")
-
-        for rec1 in self.db:
-            for rec2 in self.db:
-                if rec1 is rec2:
-                    continue
-
-                if rec1['name'] is not None and rec2['name'] is not None and rec1['name'] == rec2['name']:
-                    print(f"{rec1['name']} (game name) is in the DB more than once")
-
-                if rec1['good_name'] is not None and rec2['good_name'] and rec1['good_name'] == rec2['good_name']:
-                    print(f"{rec1['good_name']} (good name) is in the DB more than once")
-
-                if rec1['id'] == rec2['id']:
-                    print(f"{rec1['id']} (id) is in the DB more than once!!!")
-
-                if (rec1['bin_md5'] is not None and rec2['bin_md5'] is not None and
-                        rec1['bin_md5'] == rec2['bin_md5']):
-                    print(f"{rec1['bin_md5']} (bin_md5) is in the DB more than once")
-
-                if (rec1['bin_crc32'] is not None and rec2['bin_crc32'] is not None and
-                        rec1['bin_crc32'] == rec2['bin_crc32']):
-                    print(f"{rec1['bin_crc32']} (bin_crc32) is in the DB more than once")
-
-                if (rec1['cowering_crc32'] is not None and rec2['cowering_crc32'] is not None and
-                        rec1['cowering_crc32'] == rec2['cowering_crc32']):
-                    print(f"{rec1['cowering_crc32']} (cowering_crc32) is in the DB more than once")
-
-                if (rec1['cc3_filename'] is not None and rec2['cc3_filename'] is not None and
-                        rec1['cc3_filename'] == rec2['cc3_filename']):
-                    print(f"{rec1['cc3_filename']} (cc3_filename) is in the DB more than once")
-
-                data_same = False
-                attr_same = False
-                if (rec1['rom_data_md5'] is not None and rec2['rom_data_md5'] is not None and
-                        rec1['rom_data_md5'] == rec2['rom_data_md5']):
-                    data_same = True
-
-                if (rec1['rom_attr_md5'] is not None and rec2['rom_attr_md5'] is not None and
-                        rec1['rom_attr_md5'] == rec2['rom_attr_md5']):
-                    attr_same = True
-
-                if (data_same and attr_same) is True:
-                    print(f"{rec1['name']} and {rec2['name']} are the same ROM image")
-
-                if level > 1 and data_same is True:
-                    print(f"{rec1['name']} and {rec2['name']} have the same ROM data MD5")
-
-            #
-            # check the md5's on the physical files against the DB
-            #
-
-            # NOTE: cowering in the options indicates this record is only here because it is in the cowering data
-            # file and does not represent real rom file(s) I own
-            if level > 1 and (rec1['options'] is not None and 'cowering' not in rec1['options']):
-                romfilename = "{self.roms_repository}/{rec1['cc3_filename'].upper()}"
-                if os.path.isfile(romfilename) is False:
-                    print(f"I can't find the rom file {rec1['id']} is referring to.")
-
-                else:
-                    w = self.wash_rom(romfilename)
-                    cc3f = rec1['cc3_filename'].upper()
-
-                    if (w['wash']['binmd5data']['bin_md5'] is not None and rec1['bin_md5'] is not None and
-                            w['wash']['binmd5data']['bin_md5'] != rec1['bin_md5']):
-                        print(f"The bin MD5 for {rec1['id']} in the DB doesn't match what is in the romfile in the "
-                              f"repository ({cc3f})")
-
-                    if (w['wash']['crc32'] is not None and rec1['bin_crc32'] is not None and
-                            w['wash']['crc32'] != rec1['bin_crc32']):
-                        print(f"The bin CRC32 for {rec1['id']} in the DB doesn't match what is in the romfile in the "
-                              f"repository ({cc3f})")
-
-                    if (w['wash']['rommd5data']['rom_data_md5'] is not None and rec1['rom_data_md5'] is not None and
-                            w['wash']['rommd5data']['rom_data_md5'] != rec1['rom_data_md5']):
-                        print(f"The rom data MD5 for {rec1['id']} in the DB doesn't match what is in the romfile in "
-                              f"the repository ({cc3f})")
-
-                    if (w['wash']['rommd5data']['rom_attr_md5'] is not None and rec1['rom_attr_md5'] is not None and
-                            w['wash']['rommd5data']['rom_attr_md5'] != rec1['rom_attr_md5']):
-                        print(f"The rom attr MD5 for {rec1['id']} in the DB doesn't match what is in the romfile in "
-                              f"the repository ({cc3f})")
-
-            #
-            # other checks
-            #
-            if rec1['cc3_desc'] is not None and len(rec1['cc3_desc']) > 20:
-                print(f"{rec1['id']} has a CC3 description that is too long.")
-
-            if rec1['cc3_filename'] is not None and rec1['cc3_filename'] == rec1['name']:
-                print(f"{rec1['id']} doesn't appear to have a valid name")
-
-            if rec1['tags'] is None or len(rec1['tags']) == 0:
-                print(f"{rec1['id']} doesn't have any tags")
-
-            if (rec1['cc3_filename'] is None or len(rec1['cc3_filename']) == 0) and 'cowering' not in rec1['options']:
-                print(f"{rec1['id']} doesn't have a cc3_filename")
-
-            if (rec1['cc3_filename'] == rec1['name']) and (rec1['cc3_filename'] == rec1['cc3_desc']):
-                print(f"{rec1['id']} doesn't appear to have a fully fleshed out record")
-
-            if (rec1['bin_crc32'] is not None and self.cowering_data[rec1['bin_crc32']] is not None and
-                    rec1['good_name'] is not None and rec1['good_name'] != self.cowering_data[rec1['bin_crc32']]):
-                print(f"{rec1['id']} has a bad good_name")
-
-            # check against Cowering's data
-            if rec1['good_name'] is not None:
-                found_crc = False
-                for c in self.cowering_data.keys():
-                    if self.cowering_data[c] == rec1['good_name']:
-                        if rec1['bin_crc32'] != c and rec1['cowering_crc32'] != c:
-                            print(f"{rec1['id']} has a CRC32 that doesn't match Cowering's for its good_name")
-                        found_crc = True
-                        break
-                if found_crc is False:
-                    print(f"Never found a CRC in the Cowering datafile for {rec1['id']}'s good_name")
-
-            # check variant ID
-            if rec1['variant_of'] is not None:
-                found_parent = False
-                for rec2 in self.db:
-                    if rec1 is rec2:
-                        continue
-
-                    if rec1['variant_of'] == rec2['id']:
-                        found_parent = True
-                        break
-
-                if found_parent is False:
-                    print(f"{rec1['id']} has a variant_of that doesn't point to any valid record")
-
-        self.banner("Checking that all Cowering CRC32s are in the DB")
-
-        found_crc = False
-        for crc in self.cowering_data.keys():
-            for rec in self.db:
-                if rec['bin_crc32'] == crc or rec['cowering_crc32'] == crc:
-                    found_crc = True
-                    if rec['good_name'] != self.cowering_data[crc]:
-                        print(f"{rec['id']} has a good_name that doesn't match Cowering's")
-                    break
-
-        if found_crc is False:
-            print(f"Didn't find a CRC32 in the DB for {crc}: {self.cowering_data[crc]}")
-
-        if level > 1:
-            self.banner("Checking that all ROMs in the roms dir are in the DB")
-
-            files_in_db = []
-            for rec in self.db:
-                if rec['cc3_filename'] is not None:
-                    filename = rec['cc3_filename'].upper()
-                    basename, ext = os.path.splitext(filename)
-                    ext = ext[1:]
-                    if ext in allowed_romfile_extensions:
-                        files_in_db.append(filename)
-
-            files_in_repo = []
-            for romfile in os.listdir(self.roms_repository):
-                basename, ext = os.path.splitext(romfile)
-                ext = ext[1:]
-                if ext in allowed_romfile_extensions:
-                    files_in_repo.append(romfile)
-
-            for romfile in files_in_repo:
-                if romfile not in files_in_db:
-                    # we didn't find this .rom file in the DB under cc3_filename.rom
-                    # check to see if this .rom file is actually in the DB under another name
-                    parser = FileParser()
-                    rom_data, warnings = parser.calc_md5s_for_file(f"{self.roms_repository}/{romfile}")
-                    rec = self.get_record_from_rom_md5s(rom_data['rom_data_md5'], rom_data['rom_attr_md5'])
-
-                    if rec is not None:
-                        print(f"{romfile} is in the repository, but it is in the DB under {rec['id']} "
-                              f"({rec['cc3_filename'].upper()})")
-                    else:
-                        print(f"{romfile} is in the repository, but it is not in the DB")
-
-            self.banner("Checking that all ROMs in the DB are in the roms dir")
-
-            for dbfile in files_in_db:
-                if dbfile not in files_in_repo:
-                    rec = self.get_record_from_cc3filename(dbfile)
-                    print("{dbfile} is referenced in the DB ({rec['id']}), but it isn't in the repository")
-
-        if menufile is not None:
-            # check the entries in the MENULIST to be sure that they have filenames and
-            # descriptions
-
-            with open(menufile, 'r') as fh:
-                for line in fh.readlines:
-                    tag = line[:8].lower()
-
-                    # hack for menu - it should get the game tag records
-                    if tag == 'menu':
-                        tag = 'game'
-
-                    recs = self.get_all_records_from_tag(tag)
-
-                    blank_reg = re.compile('^\s*$')
-
-                    for rec in recs:
-                        if rec['cc3_desc'] is None:
-                            print(f"{rec['id']} is missing a cc3_desc")
-                        elif blank_reg.search(rec['cc3_desc']) is not None:
-                            print(f"{rec['id']} has a blank cc3_desc")
-
-                        basename, ext = os.path.splitext(rec['cc3_filename'])
-                        if ((not os.path.isfile(f"{self.manuals_repository}/{basename.upper()}.TXT")) and
-                                ('proto' not in rec['tags']) and
-                                ('demo' not in rec['tags'])):
-                            print(f"{rec['id']} is referenced for the CC3, but missing a manual file "
-                                  f"({basename.upper()}.TXT)")
-
-        if level > 2:
-            self.banner("Checking manuals")
-
-            for manfile in os.listdir(self.manuals_repository):
-                if not manfile.endswith('.TXT'):
-                    continue
-
-                found_rec = False
-                for ext in allowed_romfile_extensions:
-                    basename, junk = os.path.splitext(manfile)
-                    rec = self.get_record_from_cc3filename(basename.lower(), ext=ext)
-                    if rec is not None:
-                        found_rec = True
-
-                if found_rec is False:
-                    print(f"{manfile} is in the manuals repository, but isn't referenced in the DB")
-
-                with open(f"{self.manuals_repository}/{manfile}", 'r') as fh:
-                    for line in fh.readlines():
-                        line = line.strip(CRLF)
-                        if len(line) > 20:
-                            print(f"{manfile} has line(s) longer than 20 characters")
-                            break
+    def verify_data(self, level=1, menufile=None, incremental=False, only=None, skip=None, output_format='text'):
+        checker = DbChecker(self, level, menufile, self.checkdb_state_file)
+        checker.run(incremental, only, skip, output_format)
         return
 
     def dump_luigi(self, filename):
@@ -846,7 +779,7 @@ class IntellivisionRomsDB:
                     if data['luigi_meta']['encrypted'] is True:
                         print(f"Setting encrypted status for {rec['id']} to True")
                         rec['encrypted'] = True
-                        self.dirty = True
+                        self.set_dirty()
             except Exception as errmsg:
                 print(f"Exception processing {rec['id']} - {str(errmsg)}")
         return
@@ -866,34 +799,7 @@ def dump_luigi(args):
 def srclist(args):
     """ Dump a list of ROMs filenames that match filters. """
     inty = IntellivisionRomsDB()
-
-    this_crlf = CRLF
-    if args.nodos is True:
-        this_crlf = "\n"
-
-    ids = inty.get_all_ids('name')
-
-    for ID in ids:
-        rec = inty.get_record_from_id(ID)
-        it_matches = True
-
-        if rec['tags'] is not None:
-            romtags = rec['tags'].split(',')
-            for filt in args.filters:
-                if filt not in romtags:
-                    it_matches = False
-        else:
-            # don't print any recs without tags
-            it_matches = False
-
-        if it_matches is True:
-            if args.id is True:
-                sys.stdout.write(f"{rec['id']}{this_crlf}")
-                sys.stdout.flush()
-            else:
-                if rec['cc3_filename'] is not None:
-                    sys.stdout.write(f"{rec['cc3_filename'].upper()}{this_crlf}")
-                    sys.stdout.flush()
+    exporter.export(inty, ['srclist'], args.filters, options={'srclist_file': '-', 'nodos': args.nodos, 'ids': args.id})
     return
 
 
@@ -902,62 +808,7 @@ def srclist(args):
 def gamelist(args):
     """ Create a gamelist.xml for use on the MAME cab. """
     inty = IntellivisionRomsDB()
-    boxart = {}
-    if args.noimages is False:
-        boxart_files = os.listdir(inty.get_boxart_repository())
-
-        for bfile in boxart_files:
-            basename, ext = os.path.splitext(bfile)
-            boxart[basename] = ext
-
-    with open('gamelist.xml', 'w') as fhw:
-        fhw.write('<?xml version="1.0"?>\n')
-        fhw.write('<gameList>\n')
-
-        ids = inty.get_all_ids('name')
-
-        for ID in ids:
-            rec = inty.get_record_from_id(ID)
-
-            if rec['cc3_filename'] is None:
-                continue
-            if rec['tags'] is None:
-                continue
-
-            romtags = rec['tags'].split(',')
-
-            it_matches = True
-
-            if len(args.filters) > 0:
-                for filt in args.filters:
-                    if filt not in romtags:
-                        it_matches = False
-
-            if it_matches is False:
-                continue
-
-            fhw.write("  <game>\n")
-            fhw.write(f"    <path>./{rec['cc3_filename'].upper()}</path>\n")
-            fhw.write(f"    <name>{rec['name']}</name>\n")
-
-            image = None
-            if args.noimages is False:
-                if rec['cc3_filename'] in boxart.keys():
-                    image = f"{rec['cc3_filename']}{boxart[rec['cc3_filename']]}"
-                else:
-                    # maybe the variant parent?
-                    if rec['variant_of'] is not None:
-                        variant_rec = inty.get_record_from_id(rec['variant_of'])
-
-                        if variant_rec['cc3_filename'] in boxart.keys():
-                            image = f"{variant_rec['cc3_filename']}{boxart[variant_rec['cc3_filename']]}"
-
-            if image is not None:
-                fhw.write(f'    <image>~/.emulationstation/downloaded_images/intellivision/{image}</image>\n')
-            fhw.write('    <players />\n')
-            fhw.write('  </game>\n')
-
-        fhw.write('</gameList>\n')
+    exporter.export(inty, ['gamelist'], args.filters, options={'noimages': args.noimages})
     return
 
 
@@ -965,64 +816,37 @@ def gamelist(args):
 def cc3menus(args):
     """ Create CC3 menu files. """
     inty = IntellivisionRomsDB()
-    menulist = []
-    with open('MENULIST.TXT', 'r') as fh:
-        menulist = fh.readlines()
-
-    for line in menulist:
-        cc3file = line[:8].strip()
-
-        print(f"Writing {cc3file}.CC3")
-
-        with open('{cc3file}.CC3', 'w') as fhw:
-            if cc3file == 'MENU':
-                # main menu is special, it gets a list of all other menus at the top
-                for menu in menulist:
-                    if menu[0:8] != 'MENU    ':
-                        fhw.write(f'{menu[8:28]}{menu[0:8]}MENU')
-            else:
-                # non-main menu list get a return to the main menu
-                #                   1         2
-                #          1234567890123456789012345678
-                fhw.write("---  Main Menu   ---MENU    MENU")
-
-            tag = cc3file.lower()
-
-            # hack for menu - it is really 'game' tags
-            if tag == 'menu':
-                recs1 = inty.get_all_records_from_tag('game')
-            else:
-                recs1 = inty.get_all_records_from_tag(tag)
-
-            # another hack - brew should include brewcart
-            if tag == 'brew':
-                recs1.extend(inty.get_all_records_from_tag('brewcart'))
-
-            # perform the intersection with records that have cc3_desc fields
-            recs2 = inty.get_all_records_with_cc3desc()
-            recs = inty.recs_intersection(recs1, recs2)
-            sorted_db = []
-
-            # if a .LST file is specified, this is giving an order for the category
-            if os.path.isfile(f"{cc3file}.LST") is True:
-                with open(f'{cc3file}.LST', 'r') as fhr:
-                    for line in fhr.readline():
-                        rec = inty.get_record_from_id(line)
-                        sorted_db.append(rec)
-            else:
-                sorted_db = sorted(recs, key=lambda x: x['cc3_desc'])
-
-            for rec in sorted_db:
-                basename, ext = os.path.splitext(rec['cc3_filename'])
-                fhw.write(f"{rec['cc3_desc']:-20}{basename:-8}    ")
+    writers = exporter.export(inty, ['cc3'])
+    for filename in writers[0].get_output_files():
+        print(f"Wrote {filename}")
     return
 
 
-@subcommand([argument("cc3menu", help="CC3 menu file.")])
+@subcommand([argument("--audit", action="store_true", help="Report menu entries that lead nowhere."),
+             argument("cc3menu", help="CC3 menu file, or the top of a CC3 SD card.")])
 def dumpcc3(args):
-    """ Dump information contained in a CC3 menu file. """
-    for d in cc3.get_cc3_data(args.cc3menu):
-        print("|{d['desc']:-20}|{d['file']:-8}|{d['menu']:-4}|")
+    """ Dump information contained in a CC3 menu file or a whole card. """
+    if os.path.isdir(args.cc3menu):
+        top = args.cc3menu
+        index = cc3.scan_cc3_tree(top)
+    else:
+        top = os.path.dirname(args.cc3menu) or '.'
+        menu = os.path.splitext(os.path.basename(args.cc3menu))[0].upper()
+        index = {menu: cc3.get_cc3_data(args.cc3menu)}
+
+    if args.audit is True:
+        problems = 0
+        for menu, d, problem in cc3.audit_cc3_tree(top, index):
+            print(f"{menu}: |{d.desc:<20}|{d.file:<8}|{d.menu:<4}| {problem}")
+            problems += 1
+        print(f"{len(index)} menus, {sum(map(len, index.values()))} entries, {problems} problems", file=sys.stderr)
+        return
+
+    for menu, entries in index.items():
+        if len(index) > 1:
+            print(f"{menu}:")
+        for d in entries:
+            print(f"|{d.desc:<20}|{d.file:<8}|{d.menu:<4}|")
     return
 
 
@@ -1039,8 +863,12 @@ def tags(args):
              argument("cfgfile", help="cfg file to add to the record.")])
 def cfgfile(args):
     """ Add a .cfg file to the ROM record. """
-    inty = IntellivisionRomsDB()
+    with IntellivisionRomsDB.open(write=True) as inty:
+        add_cfgfile_to_record(inty, args)
+    return
 
+
+def add_cfgfile_to_record(inty, args):
     rec = inty.get_record_from_id(args.id)
 
     if rec is None:
@@ -1084,6 +912,49 @@ def fetchrom(args):
     return
 
 
+@subcommand([argument("--filters", "--filter", help="Only sync games with all of these tags.", action="append"),
+             argument("--descriptive", help="Name the files after the games, as mkrename does.", action="store_true"),
+             argument("--dryrun", help="Report what would change without changing anything.", action="store_true"),
+             argument("--workers", help="Number of files to copy at once.", type=int, default=4),
+             argument("target_dir", help="Directory to keep in step with the ROM repository.")])
+def sync(args):
+    """ Bring a device's ROM directory up to date with the repository, copying only what changed. """
+    if not os.path.isdir(args.target_dir):
+        raise Exception(f"{args.target_dir} doesn't seem to be a directory.")
+
+    inty = IntellivisionRomsDB()
+    desired = rom_sync.desired_files(inty, args.filters, args.descriptive)
+    manifest = rom_sync.SyncManifest(args.target_dir)
+    plan = rom_sync.plan_sync(desired, args.target_dir, manifest)
+
+    for name, source in plan.missing:
+        print(f"WARNING: {source} is missing from the repository, not syncing {name}")
+    for name in plan.left_alone:
+        print(f"WARNING: {name} has changed since it was synced, leaving it alone")
+
+    if args.dryrun is True:
+        for name, source, sha1 in plan.adopted:
+            print(f"keep {name}")
+        for old, new, source in plan.renames:
+            print(f"rename {old} -> {new}")
+        for name in plan.deletes:
+            print(f"delete {name}")
+        for name, source, sha1 in plan.copies:
+            print(f"copy {name}")
+        failed = 0
+    else:
+        try:
+            failed = rom_sync.apply_sync(plan, args.target_dir, manifest, args.workers)
+        finally:
+            manifest.save()
+
+    print(f"{len(plan.copies) - failed} copied, {len(plan.renames)} renamed, {len(plan.deletes)} deleted, "
+          f"{plan.unchanged + len(plan.adopted)} unchanged{', ' + str(failed) + ' failed' if failed > 0 else ''}")
+    if failed > 0:
+        sys.exit(1)
+    return
+
+
 @subcommand([argument("filename", help="Game filename.")])
 def wash(args):
     """ "Wash" a ROM - get CRCs for both ROM/LUIGI for and also .bin. """
@@ -1096,7 +967,12 @@ def wash(args):
 @subcommand([argument("id", help="Game ID.")])
 def edit(args):
     """ Edit a ROM record in the DB. """
-    inty = IntellivisionRomsDB()
+    with IntellivisionRomsDB.open(write=True) as inty:
+        edit_record(inty, args)
+    return
+
+
+def edit_record(inty, args):
     # this might be an iD
     rec = inty.get_record_from_id(args.id)
 
@@ -1127,7 +1003,12 @@ def edit(args):
              argument("romfile", help="ROM filename being added.")])
 def replacerom(args):
     """ Update a ROM definition in the DB. """
-    inty = IntellivisionRomsDB()
+    with IntellivisionRomsDB.open(write=True) as inty:
+        replace_rom_file(inty, args)
+    return
+
+
+def replace_rom_file(inty, args):
     ID = args.id
     rec = inty.get_record_from_id(ID)
 
@@ -1139,9 +1020,7 @@ def replacerom(args):
     data = inty.wash_rom(args.romfile)
 
     # update old data from the record that is about the physical file
-    rec['bin_md5'] = data['wash']['binmd5data']['bin_md5']
-    rec['rom_data_md5'] = data['wash']['rommd5data']['rom_data_md5']
-    rec['rom_attr_md5'] = data['wash']['rommd5data']['rom_attr_md5']
+    rec.update(fingerprint.record_fields_from_wash(data))
 
     try:
         inty.add_or_replace_rom(rec)
@@ -1150,7 +1029,7 @@ def replacerom(args):
         if args.copy is True:
             force = True
             try:
-                inty.copy_rom_file_to_repository(data['wash']['romfile'], rec['cc3_filename'].upper(), force)
+                inty.copy_rom_file_to_repository(args.romfile, rec['cc3_filename'].upper(), force, data['file_sha1'])
                 msg += f", copied to repository as {rec['cc3_filename'].upper()}"
             except Exception as errmsg:
                 msg += f", BUT COULDN'T COPY TO REPOSITORY! {errmsg}"
@@ -1161,11 +1040,29 @@ def replacerom(args):
 
 
 @subcommand([argument("--copy", help="Also copy the ROM file into the repository.", action='store_true'),
-             argument("romfile", help="ROM filename being added.")])
+             argument("romfile", help="ROM filename being added (or a zip archive holding it, or "
+                      "archive.zip!member).")])
 def add(args):
     """ Add a DB record for the given ROM file. """
-    inty = IntellivisionRomsDB()
+    with IntellivisionRomsDB.open(write=True) as inty:
+        rslt = add_rom_file(inty, args)
+    return rslt
+
+
+def add_rom_file(inty, args):
+    if archive.is_archive(args.romfile):
+        # an archive holding a single ROM can stand in for it, otherwise say which member to add
+        members = archive.rom_members(args.romfile, allowed_romfile_extensions)
+        if len(members) != 1:
+            print(f"FAILURE: {args.romfile} holds {len(members)} ROMs, add one of them as "
+                  f"{args.romfile}{archive.member_separator}<member>: {', '.join(members)}")
+            return 1
+        args.romfile = f"{args.romfile}{archive.member_separator}{members[0]}"
+
     base = args.romfile
+    parts = archive.split_member_name(base)
+    if parts is not None:
+        base = os.path.basename(parts[1])
 
     dot_idx = base.rfind('.')
     if dot_idx > 0:
@@ -1189,18 +1086,19 @@ def add(args):
         print(f"This {data['rom_file_type'].upper()} file is already in the DB as {rec['id']}")
         return 1
 
+    same = inty.find_rom_content_in_repository(data['file_sha1'])
+    if len(same) > 0:
+        print(f"This {data['rom_file_type'].upper()} file is already in the repository as {', '.join(same)}")
+        return 1
+
     rec = {}
 
     # fill in any applicable cowerings data
-    cowdata = inty.get_cowering_data()
-    try:
-        cowering_crc32 = data['bin_cowering_crc32']
-
-        if cowering_crc32 in cowdata.keys():
-            rec['good_name'] = cowdata[cowering_crc32]
-            rec['bin_cowering_crc32'] = cowering_crc32
-    except Exception:
-        pass
+    ref = inty.get_reference_index().lookup_wash(data)
+    if ref is not None:
+        rec['good_name'] = ref['good_name']
+        if 'bin_cowering_crc32' in data.keys():
+            rec['bin_cowering_crc32'] = data['bin_cowering_crc32']
 
     try:
         rec['cc3_filename'] = f"{base[0:8].lower()}.{ext.lower()}"
@@ -1285,11 +1183,7 @@ def add(args):
         msg = "ROM added to DB"
         if args.copy is True:
             try:
-                srcfile = data['wash']['romfile']
-            except Exception:
-                srcfile = args.romfile
-            try:
-                inty.copy_rom_file_to_repository(srcfile, rec['cc3_filename'].upper())
+                inty.copy_rom_file_to_repository(args.romfile, rec['cc3_filename'].upper(), sha1=data['file_sha1'])
                 msg += f", copied to repository as {rec['cc3_filename'].upper()}"
             except Exception as errmsg:
                 msg += f", BUT COULDN'T COPY TO REPOSITORY! {errmsg}"
@@ -1302,8 +1196,7 @@ def add(args):
 def interactively_edit_record(inty, rec, filename=None):
     prev_id = rec['id']
 
-    dbparser = DbParser()
-    newfilename = dbparser.write_ascii_record(rec, filename)
+    newfilename = inty.write_ascii_record(rec, filename)
     prev_rec_md5 = checksum.md5_hex_str(str(rec))
 
     if newfilename is not None:
@@ -1331,7 +1224,7 @@ def interactively_edit_record(inty, rec, filename=None):
             if rec['id'] != prev_id:
                 if 'ID in DB' in status:
                     rec['id'] = prev_id
-                    newfilename = dbparser.write_ascii_record(rec)
+                    newfilename = inty.write_ascii_record(rec)
                     print("FAILURE: you changed the ID, but the new ID is already in the DB.\nReverting the ID.")
                     input("HIT RETURN TO CONTINUE.")
                     keep_editing = True
@@ -1339,7 +1232,7 @@ def interactively_edit_record(inty, rec, filename=None):
                     rec['replace_id'] = prev_id
 
             if 'cc3_desc too long' in status:
-                newfilename = dbparser.write_ascii_record(rec)
+                newfilename = inty.write_ascii_record(rec)
                 print("FAILURE: the cc3_desc is too long")
                 input("HIT RETURN TO CONTINUE.")
                 keep_editing = True
@@ -1353,38 +1246,7 @@ def interactively_edit_record(inty, rec, filename=None):
 def createfrinklist(args):
     """ Write a list for the arcade cabinet. """
     inty = IntellivisionRomsDB()
-    ids = inty.get_all_ids("name")
-
-    for ID in ids:
-        rom = inty.get_record_from_id(ID)
-
-        cc3f = ""
-        name = ""
-        year = ""
-        auth = ""
-
-        if rom['cc3_filename'] is not None:
-            cc3f = rom['cc3_filename'].upper()
-        if rom['name'] is not None:
-            name = rom['name']
-        if rom['year'] is not None:
-            year = rom['year']
-        if rom['author'] is not None:
-            auth = rom['author']
-
-        sys.stdout.write(f"{cc3f}{CRLF}")
-        sys.stdout.write(f"{name}{CRLF}")
-        sys.stdout.write(f"{year}{CRLF}")
-        sys.stdout.write(f"{auth}{CRLF}")
-        sys.stdout.write(f"{CRLF}")             # parent rom
-        sys.stdout.write(f"{CRLF}")             # unknown entry
-        sys.stdout.write(f"Raster{CRLF}")
-        sys.stdout.write(f"Horizontal{CRLF}")
-        sys.stdout.write(f"{CRLF}")             # controller type
-        sys.stdout.write(f"Status Good{CRLF}")  # any value to putting real data here?
-        sys.stdout.write(f"Color Good{CRLF}")   # any value to putting real data here?
-        sys.stdout.write(f"Sound Good{CRLF}")   # any value to putting real data here?
-        sys.stdout.write(f"{CRLF}")             # game type
+    exporter.export(inty, ['frink'], options={'frink_file': '-'})
     return
 
 
@@ -1432,64 +1294,62 @@ def crc32(args):
     return
 
 
+def run_query(args, cmd, query_args=()):
+    # answer a command line API query from the daemon if one was given with --server and it's there, otherwise load
+    # the DB and answer it here
+    if args.server is not None:
+        try:
+            return server.send_query(args.server, cmd, query_args)
+        except OSError:
+            pass
+
+    inty = IntellivisionRomsDB(load_db=cmd not in ('rom_dir', 'kbdhackfiledir'))
+    return inty.query(cmd, query_args)
+
+
+def print_query_result(result):
+    if result is None:
+        return
+    if isinstance(result, list):
+        for i in result:
+            print(i)
+    else:
+        print(result)
+    return
+
+
 @subcommand([argument("romfile", help="ROM filename.")])
 def name_from_rom_file(args):
     """ Given a ROM filename, print the DB ID. """
-    inty = IntellivisionRomsDB()
-    rec = inty.get_record_from_cc3filename(args.romfile)
-    if rec is not None:
-        print(rec['id'])
+    print_query_result(run_query(args, 'name_from_rom_file', [args.romfile]))
     return
 
 
 @subcommand([argument("id", help="Game ID.")])
 def rom_file(args):
     """ Print name of ROM file for given game ID. """
-    inty = IntellivisionRomsDB()
-    rec = inty.get_record_from_id(args.id)
-    if rec is not None and rec['cc3_filename'] is not None:
-        print(rec['cc3_filename'])
+    print_query_result(run_query(args, 'rom_file', [args.id]))
     return
 
 
 @subcommand([argument("id", help="Game ID.")])
 def options(args):
     """ Get options to use when running game. """
-    inty = IntellivisionRomsDB()
-    rec = inty.get_record_from_id(args.id)
-    if rec is not None and rec['options'] is not None:
-        for opt in rec['options'].split(','):
-            print(opt)
+    print_query_result(run_query(args, 'options', [args.id]))
     return
 
 
 @subcommand([argument("id", help="Game ID.")])
 def kbdhackfile(args):
     """ Get name of kbdhackfile for a given game ID. """
-    inty = IntellivisionRomsDB()
-    game_id = args.id
-    hack = inty.get_laptop_default_kbdhackfile()
-
-    # special hack case for CGC
-    if game_id == 'cgc':
-        hack = 'laptop-cgc'
-    else:
-        rec = inty.get_record_from_id(game_id)
-        if rec is not None:
-            if rec['options'] is not None:
-                if 'ecs' in rec['options'].split(','):
-                    hack = inty.get_laptop_default_ecs_kbdhackfile()
-            if rec['kbdhackfile'] is not None:
-                hack = rec['kbdhackfile']
-    print(hack)
+    print_query_result(run_query(args, 'kbdhackfile', [args.id]))
     return
 
 
 @subcommand()
 def kbdhackfiledir(args):
     """ Print the directory location that contains the kbdhackfiles. """
-    inty = IntellivisionRomsDB()
-    print(inty.get_kbdhackfile_dir())
+    print_query_result(run_query(args, 'kbdhackfiledir'))
     return
 
 
@@ -1541,11 +1401,16 @@ def listgames(args):
     return
 
 
-@subcommand([argument("outfile", help="Output filename.")])
+@subcommand([argument("--format", help="json, or cdb for a constant DB the launcher can read with cdb.py.",
+                      choices=('json', 'cdb'), default='json'),
+             argument("outfile", help="Output filename.")])
 def dumpdbforpi(args):
     """ Dump the game options DB for an emulator platform. """
     inty = IntellivisionRomsDB()
-    inty.dump_game_opts_db_for_emulator(args.outfile)
+    if args.format == 'cdb':
+        inty.dump_game_opts_cdb_for_emulator(args.outfile)
+    else:
+        inty.dump_game_opts_db_for_emulator(args.outfile)
     return
 
 
@@ -1553,40 +1418,48 @@ def dumpdbforpi(args):
              argument("--log", help="Write a logfile of the actions taken.", action="store_true"),
              argument("--idonly", help="Only output the ROM ids.", action="store_true"),
              argument("--cow", help="Match only based on Cowerings data.", action="store_true"),
-             argument("filenames", help="ROM files to identify.", action='append')])
+             argument("--recursive", help="Look for ROMs in every directory under the given ones.",
+                      action="store_true"),
+             argument("filenames", help="ROM files (or zip archives of them, or with --recursive directories) to "
+                      "identify.", nargs="+")])
 def which(args):
     """ Given ROM files identify them from the data in the DB. """
-    inty = IntellivisionRomsDB()
-    rep = inty.get_roms_repository()
-
-    cowdata = {}
     if args.cow is True:
-        cowdata = inty.get_cowering_data()
+        return which_reference_dats(args)
+
+    inty = IntellivisionRomsDB()
+    cache = fingerprint.FingerprintCache(inty.fingerprint_cache_file)
 
     unknown = []
     nofiles = []
     missing = []
     possess = 0
     logpart = ""
+    copying = {}
+    count = 0
 
-    for filename in args.filenames:
+    # zip archives are replaced by their ROMs ("archive.zip!member.rom"), and everything gets washed by a pool of
+    # worker processes, with results coming back as they're ready
+    filenames, progress = which_filenames(args, cache)
+    for filename, data, errmsg in fingerprint.fingerprint_files(filenames, cache, temp_dir=inty.get_temp_dir()):
         out = f"{filename} "
+        count += 1
 
-        data = inty.wash_rom(filename)
+        if data is None:
+            out += f"ERROR: {errmsg}"
+            which_report(progress, out)
+            unknown.append(out)
+            continue
+
+        rec = None
+        where = None
+        systemrom = False
+        logpart = ""
 
         if args.idonly is True:
             out += f"[{data['rom_file_type'].upper()}] "
 
-        if args.cow is True:
-            cc = data['orig']['crc32']
-            if cc in cowdata.keys():
-                if args.idonly is True:
-                    out += f"{cc}: {cowdata[cc]}"
-                else:
-                    out += f"{cc}: UNKNOWN"
-                    logpart = "unknown"
-        else:
-            rec, where = inty.get_record_from_wash_data(data)
+        rec, where = inty.get_record_from_wash_data(data)
 
         # print(f"rlrDEBUG rec={str(rec)} where={str(where)}")
 
@@ -1602,10 +1475,11 @@ def which(args):
             if rec['cc3_filename'] is not None:
                 fname = rec['cc3_filename'].upper()
 
-                if os.path.isfile(f"{rep}/{fname}") is False:
-                    if systemrom is False and args.copy is True:
+                if inty.rom_file_exists_in_repository(fname) is False:
+                    if systemrom is False and args.copy is True and fname not in copying:
+                        # the copies are done together once everything's been identified
                         out += f", copying ROM to repository as {fname}"
-                        inty.copy_rom_file_to_repository(data['wash']['romfile'], fname)
+                        copying[fname] = (filename, fname, data['file_sha1'])
 
                     logpart = "missing"
                 else:
@@ -1613,13 +1487,11 @@ def which(args):
             else:
                 out += ", CANNOT CHECK REPOSITORY - NO CC3_FILENAME DEFINED."
                 logpart = "nofile"
-        elif args.cow is True:
-            pass
         else:
             out += "UNKNOWN"
             logpart = "unknown"
 
-        print(out)
+        which_report(progress, out)
 
         if logpart == "unknown":
             unknown.append(out)
@@ -1628,8 +1500,15 @@ def which(args):
         if logpart == "missing":
             missing.append(out)
 
-    if len(args.filenames) > 1:
-        print(f"{len(unknown)} Unknown ROMS\n{len(missing)} ROMs not in the repository\n{len(possess)} ROMs already "
+    if progress is not None:
+        progress.finish()
+
+    for src, fname, errmsg in inty.copy_rom_files_to_repository(copying.values()):
+        if errmsg is not None:
+            print(f"FAILURE: {src} not copied to repository as {fname}: {errmsg}")
+
+    if count > 1:
+        print(f"{len(unknown)} Unknown ROMS\n{len(missing)} ROMs not in the repository\n{possess} ROMs already "
               f"in the repository")
 
     if args.log is True:
@@ -1651,6 +1530,77 @@ def which(args):
     return
 
 
+def which_filenames(args, cache=None):
+    #
+    # The files which works on, as a generator: zip archives are replaced by their ROMs, and with --recursive the
+    # directories are walked as the washes keep up.  A recursive run also gets a Progress for its rate/ETA line.
+    #
+    if args.recursive is False:
+        return (archive.expand_archives(args.filenames, allowed_romfile_extensions), None)
+
+    progress = rom_scan.Progress()
+    progress.start_count(args.filenames, allowed_romfile_extensions)
+    return (rom_scan.walk_rom_files(args.filenames, allowed_romfile_extensions, cache), progress)
+
+
+def which_report(progress, out):
+    if progress is not None:
+        progress.clear()
+    print(out, flush=True)
+    if progress is not None:
+        progress.update()
+    return
+
+
+def which_reference_dats(args):
+    # which --cow: identify files against the reference DATs only.  The ROM DB is never read, bins are hashed in a
+    # single pass and the results are printed as they come, one "crc  good_name  path" line per file.
+    inty = IntellivisionRomsDB(load_db=False)
+    refs = inty.get_reference_index()
+    cache = fingerprint.FingerprintCache(inty.fingerprint_cache_file)
+
+    # the unknowns are only kept for the log, a big recursive run can turn up a lot of them
+    unknown = []
+    unknowns = 0
+    identified = 0
+    filenames, progress = which_filenames(args, cache)
+    for filename, crc, ref, errmsg in identify.identify_files(filenames, refs, cache, temp_dir=inty.temp_dir):
+        if crc is None:
+            crc = '--------'
+
+        if errmsg is not None:
+            out = f"{crc}  ERROR: {errmsg}  {filename}"
+        elif ref is None:
+            out = f"{crc}  UNKNOWN  {filename}"
+        elif args.idonly is True:
+            out = f"{crc}  {ref['good_name']}  {filename}"
+        else:
+            out = f"{crc}  {ref['good_name']} [{ref['dat']}]  {filename}"
+
+        which_report(progress, out)
+
+        if ref is None:
+            unknowns += 1
+            if args.log is True:
+                unknown.append(out)
+        else:
+            identified += 1
+
+    if progress is not None:
+        progress.finish()
+
+    if identified + unknowns > 1:
+        print(f"{identified} ROMs identified, {unknowns} unknown", file=sys.stderr)
+
+    if args.log is True:
+        with open('inty_logfile.txt', 'w') as fhw:
+            if len(unknown) > 0:
+                fhw.write(f'--- {len(unknown)} UNKNOWNS ---\n')
+                for i in unknown:
+                    fhw.write(f'{i}\n')
+    return
+
+
 @subcommand([argument("--case", help="Case sensitive search.", action="store_true"),
              argument("search", help="Search string.")])
 def search(args):
@@ -1708,12 +1658,26 @@ def search(args):
     return
 
 
-@subcommand([argument("--level", help="Level of check to perform.", default=1),
-             argument("--menufile", help="Menufile filename for CC3 checking.", nargs='?')])
+@subcommand([argument("--level", help="Level of check to perform.", type=int, default=1),
+             argument("--menufile", help="Menufile filename for CC3 checking.", nargs='?'),
+             argument("--incremental", help="Only recheck records and files that changed since the last run.",
+                      action="store_true"),
+             argument("--only", help="Comma separated list of the checks to run."),
+             argument("--skip", help="Comma separated list of checks to leave out."),
+             argument("--format", help="Output format.", choices=('text', 'jsonl'), default='text')])
 def checkdb(args):
     """ Perform internal consistency checks on the data file. """
     inty = IntellivisionRomsDB()
-    inty.verify_data(args.level, args.menufile)
+
+    only = None
+    if args.only is not None:
+        only = args.only.split(',')
+
+    skip = None
+    if args.skip is not None:
+        skip = args.skip.split(',')
+
+    inty.verify_data(args.level, args.menufile, args.incremental, only, skip, args.format)
     return
 
 
@@ -1725,57 +1689,143 @@ def checkdb(args):
 #     return
 
 
-@subcommand([argument("--filters", help="Filter by these tags.", action="append")])
+@subcommand([argument("--filters", help="Filter by these tags.", action="append"),
+             argument("--apply", help="Update the links in this directory directly instead of writing the script."),
+             argument("--romdir", help="Directory holding the 8.3 named ROM files the links point at (defaults to "
+                      "the repository)."),
+             argument("--dryrun", help="With --apply, report what would change without changing anything.",
+                      action="store_true")])
 def mkrename(args):
     """ Write a rename_roms.sh bash script for use on Linux-based emulation systems that can be used to
         rename the ROM files from the 8.3 standard used by the tooling to more descriptive game names. """
     inty = IntellivisionRomsDB()
-    with open('rename_roms.sh', 'w') as fhw:
-        ids = inty.get_all_ids('name')
+    if args.apply is None:
+        exporter.export(inty, ['rename'], args.filters)
+        return
 
-        for ID in ids:
-            rec = inty.get_record_from_id(ID)
+    # keep the symlinks up to date in place, only touching the ones that are wrong
+    rom_dir = args.romdir or inty.get_roms_repository()
+    records = [rec for rec in exporter.sorted_records(inty.db, args.filters) if rec['tags'] is not None]
+    desired, missing = rom_links.desired_links(records, rom_dir)
+    plan = rom_links.plan_links(desired, args.apply, rom_dir)
+
+    for name, path in missing:
+        print(f"WARNING: {path} doesn't exist, not linking {name}")
+    for name in plan.conflicts:
+        print(f"WARNING: {name} is already there and isn't a symlink, leaving it alone")
+
+    if args.dryrun is True:
+        for name, old_target in plan.removes:
+            print(f"remove {name}")
+        for name, target in plan.creates + [(name, target) for name, target, old_target in plan.replaces]:
+            print(f"link {name} -> {target}")
+    else:
+        rom_links.apply_links(plan, args.apply)
 
-            if rec['cc3_filename'] is None:
-                continue
-            if rec['tags'] is None:
-                continue
+    print(f"{len(plan.creates)} created, {len(plan.replaces)} replaced, {len(plan.removes)} removed, "
+          f"{plan.unchanged} unchanged")
+    return
 
-            _, ext = os.path.splitext(rec['cc3_filename'])
-            lcext = ext.lower()
 
-            romtags = rec['tags'].split(',')
-            it_matches = True
+@subcommand([argument("--targets", help="Comma separated artifacts to write (gamelist, srclist, frink, rename, pi, "
+                      "picdb, cc3).", default='gamelist,srclist,frink,rename,pi,cc3'),
+             argument("--filters", help="Only export records with all of these tags.", action="append"),
+             argument("--outdir", help="Directory to write the artifacts in.", default='.'),
+             argument("--menufile", help="CC3 menu list file.", default='MENULIST.TXT'),
+             argument("--noimages", help="Don't add image information to the gamelist.", action="store_true"),
+             argument("--nodos", help="Don't put DOS CR/LF endings on the srclist lines.", action="store_true"),
+             argument("--force", help="Rewrite every artifact, even the unchanged ones.", action="store_true"),
+             argument("--explain", help="Say why each artifact was or wasn't rewritten.", action="store_true")])
+def export(args):
+    """ Write any set of the generated artifacts in one pass over the DB, skipping the ones that haven't changed. """
+    inty = IntellivisionRomsDB()
+    targets = [t.strip() for t in args.targets.split(',') if t.strip() != '']
+    options = {'menufile': args.menufile, 'noimages': args.noimages, 'nodos': args.nodos}
+    state = exporter.ExportState(inty.export_state_file, args.force)
+
+    for writer in exporter.export(inty, targets, args.filters, args.outdir, options, state):
+        for filename, written, reason in writer.decisions:
+            out = f"{writer.target}: {'wrote' if written is True else 'unchanged'} {filename}"
+            if args.explain is True:
+                out += f" ({reason})"
+            print(out)
+    return
 
-            if args.filters is not None:
-                for filt in args.filters:
-                    if filt not in romtags:
-                        it_matches = False
 
-            if it_matches is False:
-                continue
+@subcommand()
+def rom_dir(args):
+    """ Print the location of the ROMs repository. """
+    print_query_result(run_query(args, 'rom_dir'))
+    return
 
-            if rec['flashback_name'] is not None:
-                game_name = rec['flashback_name']
-            else:
-                game_name = rec['name']
 
-                game_name = re.sub('["!/]', '', game_name)
-                game_name = re.sub("'", '', game_name)
-                game_name = re.sub("&", 'and', game_name)
+@subcommand([argument("--format", help="Output format.", choices=('json', 'shell'), default='json'),
+             argument("id", help="Game ID or cc3_filename.")])
+def launchinfo(args):
+    """ Print everything needed to launch a game (ROM path, options, kbdhackfile, cfg) in one go. """
+    info = run_query(args, 'launchinfo', [args.id])
+    if info is None:
+        print(f"{args.id}: unknown ROM ID", file=sys.stderr)
+        return 1
 
-            # TODO: this won't work with Desert Bus (.BIN game) - need a better multi-extension solution
-            fhw.write(f"rm '/home/pi/RetroPie/roms/intellivision/{game_name}{lcext}' > /dev/null 2>&1\n")
-            fhw.write(f"ln -s /home/pi/all_inty_roms/{rec['cc3_filename'].upper()} "
-                      f"'/home/pi/RetroPie/roms/intellivision/{game_name}{lcext}'\n")
+    if args.format == 'json':
+        print(json.dumps(info))
+        return
+
+    # eval-able shell assignments, eg: eval "$(inty launchinfo --format shell astro)"
+    for k, v in info.items():
+        if v is None:
+            v = ''
+        elif isinstance(v, list):
+            v = ' '.join(v)
+        print(f"INTY_{k.upper()}={shlex.quote(v)}")
     return
 
 
-@subcommand()
-def rom_dir(args):
-    """ Print the location of the ROMs repository. """
-    inty = IntellivisionRomsDB()
-    print(inty.get_roms_repository())
+@subcommand([argument("--stdin", help="Read queries from stdin, one per line.", action="store_true"),
+             argument("words", help="A single query, eg: rom_file <game ID>.", nargs='*')])
+def query(args):
+    """ Answer command line API queries (rom_file <id>, options <id>, lookup cc3_filename=<x>, ...) as JSON. """
+    #
+    # With --stdin the DB is loaded once and then every line read is answered with one JSON line, flushed straight
+    # away, so this can be left running as a coprocess.  Results look like the daemon's:
+    #
+    #     {"query": "rom_file astro", "ok": true, "result": "astro.rom"}
+    #     {"query": "rom_file nope", "ok": true, "result": null}
+    #     {"query": "bogus", "ok": false, "error": "Unknown query: bogus"}
+    #
+    # If inty_data.dat changes while it is running, the DB gets reloaded before the next answer.
+    #
+    runner = server.QueryRunner(IntellivisionRomsDB, IntellivisionRomsDB(load_db=False).inty_data_file)
+
+    if args.stdin is True:
+        lines = sys.stdin
+    else:
+        lines = [shlex.join(args.words)]
+
+    for line in lines:
+        line = line.strip()
+        if len(line) == 0 or line[0] == '#':
+            continue
+
+        try:
+            words = shlex.split(line)
+            out = {'query': line, 'ok': True, 'result': runner.run_query(words[0], words[1:])}
+        except Exception as errmsg:
+            out = {'query': line, 'ok': False, 'error': str(errmsg)}
+
+        print(json.dumps(out), flush=True)
+    return
+
+
+@subcommand([argument("socket", help="Unix socket to listen on.", nargs='?', default=f'{tool_dir}/inty.sock')])
+def serve(args):
+    """ Keep the DB loaded and answer command line API queries (rom_file, options, ...) on a Unix socket. """
+    inty = IntellivisionRomsDB(load_db=False)
+    try:
+        server.serve(args.socket, IntellivisionRomsDB, inty.inty_data_file)
+    except KeyboardInterrupt:
+        pass
     return
 
 
@@ -1787,7 +1837,7 @@ inty command [options]
 
   help for more complete description of commands
 
-  which [--copy] [--log] [--idonly] [--cow] <files>
+  which [--copy] [--log] [--idonly] [--cow] [--recursive] <files/dirs>
   list [--tag <tag>] [<game ID>]
   add [--copy] <file>
   edit <game ID>
@@ -1797,17 +1847,23 @@ inty command [options]
   tags
   cc3menus
   fetchrom <game ID>
+  sync [--filters <tag>] [--descriptive] [--dryrun] <target dir>
 
   writedb
   checkdb [--level <#>] [<menulist file>]
   cfgfile <game ID> <file>
   md5 <file>
   options <game ID>
-  dumpcc3 <CC3 menu file>
-  mkrename <filter>
+  dumpcc3 [--audit] <CC3 menu file or card dir>
+  mkrename [--filters <tag>] [--apply <link dir>] [--dryrun]
+  export [--targets <list>] [--filters <tag>] [--outdir <dir>] [--force] [--explain]
   rom_dir
   rom_file <game ID>
   kbdhackfile <game ID>
+  serve [<socket>]
+  query [--stdin] [<query>]
+  launchinfo [--format json|shell] <game ID>
+  --server <socket> rom_file|options|kbdhackfile|... <game ID>
 """
     print(shelp)
     return
@@ -1844,7 +1900,7 @@ def get_cfg_file(args):
 #
 # --- User commands ---
 #
-# which [--copy] [--log] [--idonly] [--cow] <files>
+# which [--copy] [--log] [--idonly] [--cow] [--recursive] <files/dirs>
 #       Report the identity of the given ROM or BIN files.
 #       If --copy is given, the ROM version of the file will be copied to the
 #        repository if it is not present.
@@ -1852,6 +1908,10 @@ def get_cfg_file(args):
 #       If --idonly is given, only the ID of the file will be displayed.
 #       If --cow is given, the DB data will be ignored and the file will only be
 #        matched based on the CRC data in the Cowering data file.
+#       Zip archives are read in place, each ROM in one reported as
+#        archive.zip!member.rom; nothing is extracted unless --copy is given.
+#       If --recursive is given, every ROM under the given directories is
+#        identified, with a live rate/ETA line on stderr.
 #
 # list [--tag <tag>] [<game ID>]
 #       Dump the games in the repository.
@@ -1862,6 +1922,7 @@ def get_cfg_file(args):
 #       Add a DB record for the given ROM file.
 #       If --copy is given, the ROM version of the file will be copied to the
 #       repository.
+#       The file can be a zip archive holding a single ROM, or archive.zip!member.
 #
 # edit <game ID>
 #       Edit the DB record for the given game ID.
@@ -1889,9 +1950,16 @@ def get_cfg_file(args):
 # fetchrom <game ID>
 #       Make a local copy of the rom file for a given game ID.
 #
-# mkrename <filter>
+# sync [--filters <tag>] [--descriptive] [--dryrun] [--workers <#>] <target dir>
+#       Make a device's ROM directory (a CC3 card, the Pi's ROM directory) hold the repository's ROM files for the
+#       games matching the filters, named as in the repository or with --descriptive after the games.  Only files
+#       that changed are copied, renamed or deleted, and every copy is checked against the repository file.
+#
+# mkrename [--filters <tag>] [--apply <link dir> [--romdir <dir>] [--dryrun]]
 #       Write a bash script that will rename all the roms matching the filter
-#       to more descriptive filenames.
+#       to more descriptive filenames.  With --apply, update the symlinks in the
+#       link directory directly, creating, replacing or removing only the ones
+#       that are wrong.  Files that go with a ROM (a .BIN's .CFG) are linked too.
 #
 # gamelist <filter>
 #       Write an .xml gamelist file for emulation station.
@@ -1920,8 +1988,9 @@ def get_cfg_file(args):
 #       Report the jzinty emulator options for the given game ID.
 #        (really just for command line API purposes)
 #
-# dumpcc3 <CC3 menu file>
-#       Dump the contents of a CC3 menu file.
+# dumpcc3 [--audit] <CC3 menu file or card dir>
+#       Dump the contents of a CC3 menu file, or of every menu on a CC3 SD card.  With --audit, report the menu
+#       entries that lead nowhere instead (games with no ROM file, links to missing menus).
 #
 # rom_dir
 #       Report the repository directory where the ROM files are stored.
@@ -1942,8 +2011,8 @@ def get_cfg_file(args):
 @subcommand()
 def write_inty_data_file(args):
     """ Rewrite the data file.  Will normalize all the records and put them in ID order in the file. """
-    inty = IntellivisionRomsDB()
-    inty.set_dirty()
+    with IntellivisionRomsDB.open(write=True) as inty:
+        inty.set_dirty()
     return
 
 
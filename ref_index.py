@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import fnmatch
+import xml.etree.ElementTree as ET
+
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(tool_dir)
+
+import cowering
+
+ref_index_version = 1
+dat_extensions = ('.dat', '.xml')
+
+
+def is_logiqx_xml(filename):
+    with open(filename, 'rb') as fh:
+        start = fh.read(512).lstrip()
+    return start.startswith(b'<')
+
+
+def read_logiqx_roms(filename):
+    #
+    # Generator yielding a dict for every rom in a Logiqx XML DAT (No-Intro, TOSEC, ...), in the same form as
+    # cowering.read_dat_roms.  The file is streamed and each game is thrown away once its roms are out.
+    #
+    for event, elem in ET.iterparse(filename, events=('end',)):
+        if elem.tag not in ('game', 'machine'):
+            continue
+
+        desc = elem.find('description')
+        good_name = elem.get('name') or ''
+        if desc is not None and desc.text:
+            good_name = desc.text
+
+        for r in elem.iter('rom'):
+            rom = {'good_name': good_name}
+            for k in ('name', 'size', 'crc', 'md5', 'sha1'):
+                if r.get(k) is not None:
+                    rom[k] = r.get(k)
+            yield rom
+
+        elem.clear()
+    return
+
+
+def read_reference_roms(filename):
+    if is_logiqx_xml(filename):
+        return read_logiqx_roms(filename)
+    return cowering.read_dat_roms(filename)
+
+
+def order_dats(filenames, priority=()):
+    # DATs matching earlier priority patterns (fnmatch against the basename) come first, anything else after them in
+    # name order
+    def rank(filename):
+        base = os.path.basename(filename)
+        for i, pattern in enumerate(priority):
+            if fnmatch.fnmatch(base, pattern):
+                return (i, base)
+        return (len(priority), base)
+    return sorted(filenames, key=rank)
+
+
+class ReferenceIndex:
+    #
+    # Index of the roms in any number of reference DATs, merged so that when several DATs know the same CRC, MD5 or
+    # SHA1 the one earliest in the priority order wins.
+    #
+    # Each rom is a single tuple (good_name, rom name, size, DAT number) in self.entries, and the CRC (int), MD5 and
+    # SHA1 (bytes) maps just hold positions in that list, so a lookup is a dict access or two however many DATs
+    # are loaded.
+    #
+    def __init__(self, dat_files, priority=(), cache_file=None):
+        self.dat_files = order_dats([f for f in dat_files if os.path.isfile(f)], priority)
+        self.cache_file = cache_file
+        self.entries = []
+        self.by_crc = {}
+        self.by_md5 = {}
+        self.by_sha1 = {}
+
+        sources = self.get_sources()
+        if self.load_cache(sources) is False:
+            for i, filename in enumerate(self.dat_files):
+                self.add_dat(filename, i)
+            self.save_cache(sources)
+        return
+
+    def get_sources(self):
+        sources = []
+        for filename in self.dat_files:
+            st = os.stat(filename)
+            sources.append([os.path.abspath(filename), st.st_size, st.st_mtime_ns])
+        return sources
+
+    def add_dat(self, filename, dat_number):
+        names = {}
+        for rom in read_reference_roms(filename):
+            rom = cowering.normalize_rom(rom)
+            if rom is None:
+                continue
+
+            # lots of roms share a game name, so only keep one copy of each
+            good_name = names.setdefault(rom['good_name'], rom['good_name'])
+            self.add_entry((good_name, rom['name'], rom['size'], dat_number), rom['crc'],
+                           rom.get('md5'), rom.get('sha1'))
+        return
+
+    def add_entry(self, entry, crc, md5=None, sha1=None):
+        n = len(self.entries)
+        self.entries.append(entry)
+
+        # DATs are added in priority order, so the first entry for a key is the one to keep
+        self.by_crc.setdefault(crc, n)
+        if md5 is not None:
+            self.by_md5.setdefault(bytes.fromhex(md5), n)
+        if sha1 is not None:
+            self.by_sha1.setdefault(bytes.fromhex(sha1), n)
+        return
+
+    def load_cache(self, sources):
+        if self.cache_file is None or os.path.isfile(self.cache_file) is False:
+            return False
+
+        try:
+            with open(self.cache_file, 'r') as fh:
+                cached = json.load(fh)
+
+            if cached['version'] != ref_index_version or cached['sources'] != sources:
+                return False
+
+            self.entries = [tuple(e) for e in cached['entries']]
+            self.by_crc = {crc: n for crc, n in cached['crc']}
+            self.by_md5 = {bytes.fromhex(h): n for h, n in cached['md5']}
+            self.by_sha1 = {bytes.fromhex(h): n for h, n in cached['sha1']}
+        except Exception:
+            # a damaged cache just gets rebuilt
+            self.entries = []
+            self.by_crc = {}
+            self.by_md5 = {}
+            self.by_sha1 = {}
+            return False
+        return True
+
+    def save_cache(self, sources):
+        if self.cache_file is None:
+            return
+
+        cached = {'version': ref_index_version, 'sources': sources, 'entries': self.entries,
+                  'crc': list(self.by_crc.items()),
+                  'md5': [[h.hex(), n] for h, n in self.by_md5.items()],
+                  'sha1': [[h.hex(), n] for h, n in self.by_sha1.items()]}
+
+        temp_file = f"{self.cache_file}.tmp.{os.getpid()}"
+        try:
+            with open(temp_file, 'w') as fh:
+                json.dump(cached, fh, separators=(',', ':'))
+            os.replace(temp_file, self.cache_file)
+        except OSError:
+            # not being able to write the cache only costs time on the next run
+            if os.path.isfile(temp_file):
+                os.remove(temp_file)
+        return
+
+    def get_number_of_roms(self):
+        return len(self.entries)
+
+    def entry_to_dict(self, n, matched_on):
+        good_name, name, size, dat_number = self.entries[n]
+        return {'good_name': good_name, 'name': name, 'size': size, 'dat': os.path.basename(self.dat_files[dat_number]),
+                'matched_on': matched_on}
+
+    def lookup(self, crc=None, md5=None, sha1=None, size=None):
+        #
+        # Find the reference rom for a file.  Every hash given is looked up, and if they turn up roms from different
+        # DATs the one from the highest priority DAT wins (the strongest hash - SHA1, then MD5, then CRC32 - breaks
+        # ties).  A CRC match is only accepted if the sizes agree (when both are known).  CRCs can be ints or hex
+        # strings of either case.
+        #
+        # Returns a dict with good_name, name, size, dat and matched_on, or None.
+        #
+        candidates = []
+        if sha1 is not None:
+            n = self.by_sha1.get(bytes.fromhex(sha1))
+            if n is not None:
+                candidates.append((self.entries[n][3], 0, n, 'sha1'))
+
+        if md5 is not None:
+            n = self.by_md5.get(bytes.fromhex(md5))
+            if n is not None:
+                candidates.append((self.entries[n][3], 1, n, 'md5'))
+
+        if crc is not None:
+            if isinstance(crc, str):
+                crc = int(crc, 16)
+            n = self.by_crc.get(crc)
+            if n is not None:
+                entry_size = self.entries[n][2]
+                if size is None or entry_size is None or size == entry_size:
+                    candidates.append((self.entries[n][3], 2, n, 'crc32'))
+
+        if len(candidates) == 0:
+            return None
+
+        best = min(candidates)
+        return self.entry_to_dict(best[2], best[3])
+
+    def lookup_wash(self, wash):
+        # look up a wash from fingerprint.wash_rom_file.  Only a bin file's own size and SHA1 describe the same bytes
+        # as its Cowering CRC, so for roms and luigis the match is on the CRC of the converted bin alone.
+        crc = wash.get('bin_cowering_crc32')
+        size = None
+        sha1 = None
+        if wash.get('rom_file_type') == 'bin':
+            size = wash.get('file_size')
+            sha1 = wash.get('file_sha1')
+
+        if crc is None and sha1 is None:
+            return None
+        return self.lookup(crc=crc, sha1=sha1, size=size)
+
+
+def find_dat_files(dat_dir):
+    if dat_dir is None or os.path.isdir(dat_dir) is False:
+        return []
+
+    out = []
+    for entry in os.scandir(dat_dir):
+        if entry.is_file() and os.path.splitext(entry.name)[1].lower() in dat_extensions:
+            out.append(entry.path)
+    return out
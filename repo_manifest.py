@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(tool_dir)
+
+import archive
+
+#
+# What's in the ROM repository, by name and by content, without hashing every file every time.
+#
+# The manifest maps each filename in the repository to its size, mtime and SHA1 (the same hash as a wash's
+# file_sha1), with an index from SHA1 to the filenames holding that content.  It's saved next to the DB, and
+# bringing it up to date is one scandir pass over the repository: files whose size and mtime are the same as last
+# time keep their SHA1, and only new files and files that changed (including ones rewritten in place, which don't
+# change the directory's own mtime) are hashed again.  A repository directory that doesn't exist is just empty.
+#
+# The tool's own copies into the repository update the manifest as they go (add_file).
+#
+
+repo_manifest_version = 2
+
+
+class RepositoryManifest:
+    def __init__(self, rom_dir, manifest_file=None):
+        self.rom_dir = rom_dir
+        self.manifest_file = manifest_file
+        self.files = {}
+        self.by_sha1 = {}
+        self.dirty = False
+
+        self.load()
+        self.refresh()
+        return
+
+    def load(self):
+        if self.manifest_file is None or os.path.isfile(self.manifest_file) is False:
+            return
+
+        try:
+            with open(self.manifest_file, 'r') as fh:
+                manifest = json.load(fh)
+            if manifest['version'] != repo_manifest_version or manifest['rom_dir'] != os.path.abspath(self.rom_dir):
+                return
+            self.files = {name: tuple(v) for name, v in manifest['files'].items()}
+        except Exception:
+            # a damaged manifest just gets rebuilt
+            self.files = {}
+        self.index()
+        return
+
+    def save(self):
+        if self.manifest_file is None or self.dirty is False:
+            return
+
+        manifest = {'version': repo_manifest_version, 'rom_dir': os.path.abspath(self.rom_dir), 'files': self.files}
+        temp_file = f"{self.manifest_file}.tmp.{os.getpid()}"
+        try:
+            with open(temp_file, 'w') as fh:
+                json.dump(manifest, fh, separators=(',', ':'))
+            os.replace(temp_file, self.manifest_file)
+        except OSError:
+            # not being able to write the manifest only costs a rescan next time
+            if os.path.isfile(temp_file):
+                os.remove(temp_file)
+        self.dirty = False
+        return
+
+    def index(self):
+        self.by_sha1 = {}
+        for name, (size, mtime_ns, sha1) in self.files.items():
+            self.by_sha1.setdefault(sha1, []).append(name)
+        return
+
+    def refresh(self):
+        # bring the manifest up to date with the directory, hashing only the files that are new or have changed
+        files = {}
+        if os.path.isdir(self.rom_dir):
+            with os.scandir(self.rom_dir) as it:
+                for entry in it:
+                    if entry.name.startswith('.') or entry.is_file() is False:
+                        continue
+
+                    st = entry.stat()
+                    prev = self.files.get(entry.name)
+                    if prev is not None and prev[0] == st.st_size and prev[1] == st.st_mtime_ns:
+                        files[entry.name] = prev
+                    else:
+                        files[entry.name] = (st.st_size, st.st_mtime_ns, archive.file_sha1(entry.path))
+
+        if files == self.files:
+            return
+
+        self.files = files
+        self.dirty = True
+        self.index()
+        self.save()
+        return
+
+    def exists(self, name):
+        return name in self.files
+
+    def get_sha1(self, name):
+        entry = self.files.get(name)
+        return entry[2] if entry is not None else None
+
+    def find_by_sha1(self, sha1):
+        return list(self.by_sha1.get(sha1.lower(), []))
+
+    def duplicates(self):
+        # lists of filenames that all have the same contents
+        return [sorted(names) for names in self.by_sha1.values() if len(names) > 1]
+
+    def add_file(self, name, sha1=None):
+        # record a file the tool just put in the repository (sha1 is its already known hash, if there is one)
+        st = os.stat(os.path.join(self.rom_dir, name))
+        if sha1 is None:
+            sha1 = archive.file_sha1(os.path.join(self.rom_dir, name))
+
+        prev = self.files.get(name)
+        if prev is not None and name in self.by_sha1.get(prev[2], []):
+            self.by_sha1[prev[2]].remove(name)
+            if len(self.by_sha1[prev[2]]) == 0:
+                del self.by_sha1[prev[2]]
+
+        self.files[name] = (st.st_size, st.st_mtime_ns, sha1.lower())
+        self.by_sha1.setdefault(sha1.lower(), []).append(name)
+        self.dirty = True
+        return
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import re
+
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(tool_dir)
+
+#
+# Maintains a directory of symlinks with descriptive game names (what EmulationStation on the Pi shows) pointing at
+# the 8.3 named files in a ROM directory.  The links a set of games should have are worked out up front and only
+# the ones that differ from what's in the directory get created, replaced or removed.
+#
+# A game's links cover every file in the ROM directory with its ROM's base name, so a .BIN game's .CFG gets linked
+# under the same descriptive name as the .BIN.
+#
+
+
+def descriptive_game_name(rec):
+    # the name a game's files go by on Linux-based emulation systems: its flashback or DB name, cleaned up to be
+    # shell and filesystem friendly
+    if rec['flashback_name'] is not None:
+        return rec['flashback_name']
+
+    game_name = rec['name']
+    game_name = re.sub('["!/]', '', game_name)
+    game_name = re.sub("'", '', game_name)
+    game_name = re.sub("&", 'and', game_name)
+    return game_name
+
+
+def files_by_base(rom_dir):
+    # upper case base name -> the files in rom_dir with it
+    out = {}
+    with os.scandir(rom_dir) as it:
+        for entry in it:
+            if entry.is_file():
+                base, ext = os.path.splitext(entry.name)
+                out.setdefault(base.upper(), []).append(entry.name)
+    for names in out.values():
+        names.sort()
+    return out
+
+
+def game_links(rec, by_base):
+    # (link name, ROM directory filename) for the game's ROM and any files that go with it
+    romfile = rec['cc3_filename'].upper()
+    base, ext = os.path.splitext(romfile)
+    game_name = descriptive_game_name(rec)
+
+    links = [(f"{game_name}{ext.lower()}", romfile)]
+    for fname in by_base.get(base, []):
+        if fname.upper() != romfile:
+            links.append((f"{game_name}{os.path.splitext(fname)[1].lower()}", fname))
+    return links
+
+
+def desired_links(records, rom_dir, by_base=None):
+    # link name -> path in rom_dir for every record, and the (link name, path) pairs whose file isn't there
+    rom_dir = os.path.abspath(rom_dir)
+    if by_base is None:
+        by_base = files_by_base(rom_dir)
+    present = set(f for names in by_base.values() for f in names)
+
+    desired = {}
+    missing = []
+    for rec in records:
+        if rec['cc3_filename'] is None:
+            continue
+
+        for name, fname in game_links(rec, by_base):
+            path = os.path.join(rom_dir, fname)
+            if name in desired and desired[name] != path:
+                raise Exception(f"Two games would both be linked as {name}, give one of them a different name")
+            if fname in present:
+                desired[name] = path
+            else:
+                missing.append((name, path))
+    return desired, missing
+
+
+class LinkPlan:
+    def __init__(self):
+        self.creates = []    # (link name, target)
+        self.replaces = []   # (link name, target, old target)
+        self.removes = []    # (link name, old target)
+        self.conflicts = []  # link names taken by something that isn't a symlink
+        self.unchanged = 0
+        return
+
+
+def plan_links(desired, link_dir, rom_dir):
+    #
+    # Diff the desired links against link_dir.  Symlinks into rom_dir that no game wants are removed, anything else
+    # already in the directory (real files, links elsewhere) is left as it is.
+    #
+    rom_dir = os.path.abspath(rom_dir)
+    current = {}
+    others = set()
+    with os.scandir(link_dir) as it:
+        for entry in it:
+            if entry.is_symlink():
+                current[entry.name] = os.readlink(entry.path)
+            else:
+                others.add(entry.name)
+
+    plan = LinkPlan()
+    for name, target in sorted(desired.items()):
+        if name in others:
+            plan.conflicts.append(name)
+        elif name not in current:
+            plan.creates.append((name, target))
+        elif current[name] != target:
+            plan.replaces.append((name, target, current[name]))
+        else:
+            plan.unchanged += 1
+
+    for name, target in sorted(current.items()):
+        if name not in desired and os.path.dirname(os.path.abspath(os.path.join(link_dir, target))) == rom_dir:
+            plan.removes.append((name, target))
+    return plan
+
+
+def apply_links(plan, link_dir, report=print):
+    for name, old_target in plan.removes:
+        os.remove(os.path.join(link_dir, name))
+        report(f"remove {name}")
+
+    for name, target in plan.creates + [(name, target) for name, target, old_target in plan.replaces]:
+        # a new link goes in under a temp name and is renamed over the old one, so the name always works
+        path = os.path.join(link_dir, name)
+        temp_link = f"{path}.tmp.{os.getpid()}"
+        os.symlink(target, temp_link)
+        try:
+            os.replace(temp_link, path)
+        except BaseException:
+            os.remove(temp_link)
+            raise
+        report(f"link {name} -> {target}")
+    return
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import time
+import zipfile
+import threading
+
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(tool_dir)
+
+import archive
+from file_parser import rom_file_type_from_header
+
+#
+# Walking directory trees of ROM dumps, lazily.
+#
+# walk_rom_files is a generator over everything under the given directories that looks like a ROM, so the rest of
+# a pipeline (washes, lookups) starts on the first file straight away and holds no more than a directory's worth of
+# names however big the tree is.  The total that Progress needs for its ETA comes from a second walk, in a thread,
+# that only counts.
+#
+
+
+def has_rom_magic(path, ext):
+    # luigis and roms have headers to check, a bin is anything that isn't empty
+    try:
+        with open(path, 'rb') as fh:
+            header = fh.read(3)
+    except OSError:
+        return False
+
+    if ext == 'ZIP':
+        return zipfile.is_zipfile(path)
+    if len(header) < 3:
+        return ext == 'BIN' and len(header) > 0
+    if ext == 'LUIGI':
+        return rom_file_type_from_header(header) == 'luigi'
+    if ext == 'ROM':
+        return rom_file_type_from_header(header) == 'rom'
+    return True
+
+
+def walk_tree(top):
+    # generator over the regular files under top (not following symlinked directories), in name order
+    dirs = [top]
+    while len(dirs) > 0:
+        current = dirs.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path
+            except OSError:
+                continue
+        dirs.extend(reversed(subdirs))
+    return
+
+
+def walk_rom_files(paths, extensions, cache=None):
+    #
+    # Generator over the ROMs in paths: files are taken as they are, directories are walked for files with one of
+    # the (upper case) extensions whose first bytes look right, and zip archives found on the way are replaced by
+    # their ROM members.  Files the cache already has a wash for aren't opened to check them.
+    #
+    for path in paths:
+        if os.path.isdir(path) is False:
+            for name in archive.expand_archives([path], extensions):
+                yield name
+            continue
+
+        for filename in walk_tree(path):
+            ext = os.path.splitext(filename)[1][1:].upper()
+            if ext not in extensions and ext != 'ZIP':
+                continue
+
+            if cache is not None and cache.get(filename) is not None:
+                yield filename
+            elif has_rom_magic(filename, ext):
+                if ext == 'ZIP':
+                    for member in archive.rom_members(filename, extensions):
+                        yield f"{filename}{archive.member_separator}{member}"
+                else:
+                    yield filename
+    return
+
+
+def count_rom_files(paths, extensions):
+    # roughly how many ROMs walk_rom_files will find - by extension only, and counting the members of archives
+    total = 0
+    for path in paths:
+        if os.path.isdir(path) is False:
+            total += 1
+            continue
+
+        for filename in walk_tree(path):
+            ext = os.path.splitext(filename)[1][1:].upper()
+            if ext == 'ZIP':
+                try:
+                    total += len(archive.rom_members(filename, extensions))
+                except (OSError, zipfile.BadZipFile):
+                    pass
+            elif ext in extensions:
+                total += 1
+    return total
+
+
+class Progress:
+    #
+    # A live "n/total files, rate, ETA" line on stderr, redrawn at most every interval seconds.  The total is
+    # counted in a background thread (start_count), and until it's known the ETA is left out.  Anything else
+    # printed while the line is up should go through clear() first, which only has to rub the line out when stdout
+    # is the same terminal (the line comes back at the next redraw).
+    #
+    def __init__(self, interval=0.5, stream=sys.stderr):
+        self.stream = stream
+        self.interval = interval
+        self.live = stream.isatty()
+        self.shared = self.live and sys.stdout.isatty()
+        self.start = time.monotonic()
+        self.last_draw = 0.0
+        self.done = 0
+        self.total = None
+        self.shown = False
+        return
+
+    def start_count(self, paths, extensions):
+        def count():
+            self.total = count_rom_files(paths, extensions)
+            return
+        threading.Thread(target=count, daemon=True).start()
+        return
+
+    def line(self):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        rate = self.done / elapsed
+        out = f"{self.done}"
+        if self.total is not None:
+            out += f"/{max(self.total, self.done)}"
+        out += f" files, {rate:.1f}/s, {elapsed:.0f}s"
+
+        if self.total is not None and rate > 0:
+            remaining = max(self.total - self.done, 0) / rate
+            out += f", ETA {int(remaining // 60)}:{int(remaining % 60):02d}"
+        elif self.total is None:
+            out += ", counting"
+        return out
+
+    def update(self, n=1):
+        self.done += n
+        now = time.monotonic()
+        if self.live is True and now - self.last_draw >= self.interval:
+            self.stream.write(f"\r\033[K{self.line()}")
+            self.stream.flush()
+            self.last_draw = now
+            self.shown = True
+        return
+
+    def clear(self):
+        if self.shown is True and self.shared is True:
+            self.stream.write("\r\033[K")
+            self.stream.flush()
+            self.shown = False
+        return
+
+    def finish(self):
+        if self.shown is True:
+            self.stream.write("\r\033[K")
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        print(f"{self.done} files in {elapsed:.1f}s, {self.done / elapsed:.1f}/s", file=self.stream)
+        return
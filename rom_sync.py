@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import concurrent.futures
+
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(tool_dir)
+
+import archive
+import exporter
+import rom_links
+import file_transfer
+
+#
+# Keeps a directory on a device (a CC3 SD card, the Pi's ROM directory, ...) in step with the ROM repository.
+#
+# The target holds a manifest of every file sync put there - its size, mtime and SHA1, and the size and mtime of
+# the repository file it came from.  A file whose own stamp and source stamp both match the manifest is left alone
+# without being read, so a sync after a one game change only hashes and copies that one game.  Content that's
+# already on the target under another name is renamed rather than copied again, and files sync put there that are
+# no longer wanted are deleted.  Anything else in the target directory is never touched unless a synced file has to
+# take its name.
+#
+
+sync_manifest_name = '.inty_sync.json'
+sync_manifest_version = 1
+temp_suffix = '.inty_sync.tmp'
+
+
+def file_stamp(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class SyncManifest:
+    # name -> {'stamp': [size, mtime_ns], 'sha1': ..., 'source': [path, size, mtime_ns]} for the files sync put in
+    # target_dir
+    def __init__(self, target_dir):
+        self.filename = os.path.join(target_dir, sync_manifest_name)
+        self.files = {}
+
+        if os.path.isfile(self.filename):
+            try:
+                with open(self.filename, 'r') as fh:
+                    manifest = json.load(fh)
+                if manifest['version'] == sync_manifest_version:
+                    self.files = manifest['files']
+            except Exception:
+                # without a manifest every file gets checked by content, so nothing is lost but time
+                self.files = {}
+        return
+
+    def save(self):
+        temp_file = f"{self.filename}{temp_suffix}"
+        with open(temp_file, 'w') as fh:
+            json.dump({'version': sync_manifest_version, 'files': self.files}, fh, indent=1, sort_keys=True)
+        os.replace(temp_file, self.filename)
+        return
+
+
+class SyncPlan:
+    def __init__(self):
+        self.copies = []      # (name, source path, sha1)
+        self.renames = []     # (old name, new name, source path)
+        self.deletes = []     # names
+        self.adopted = []     # (name, source path, sha1) already on the target with the right content
+        self.unchanged = 0
+        self.missing = []     # (name, source path) with no file in the repository
+        self.left_alone = []  # names sync put there once, but that have been changed since
+        return
+
+    def is_empty(self):
+        return len(self.copies) + len(self.renames) + len(self.deletes) + len(self.adopted) == 0
+
+
+def desired_files(inty, filters=None, descriptive=False):
+    # target name -> repository file for every record matching the filters, along with the files that go with each
+    # ROM (a .BIN's .CFG), named the same way mkrename names them
+    rom_dir = inty.get_roms_repository()
+    by_base = rom_links.files_by_base(rom_dir)
+
+    desired = {}
+    for rec in exporter.sorted_records(inty.db, filters):
+        if rec['cc3_filename'] is None:
+            continue
+
+        for link_name, fname in rom_links.game_links(rec, by_base):
+            name = link_name if descriptive is True else fname
+            if name in desired:
+                raise Exception(f"Two games would both be synced as {name}, give one of them a different name")
+            desired[name] = os.path.join(rom_dir, fname)
+    return desired
+
+
+def plan_sync(desired, target_dir, manifest):
+    #
+    # Work out the copies, renames and deletes that make target_dir hold exactly the desired files.  Only files
+    # whose stamps don't match the manifest get read.
+    #
+    current = {}
+    with os.scandir(target_dir) as it:
+        for entry in it:
+            # the manifest and any temp files left by an interrupted sync aren't part of it
+            if entry.is_file() and not entry.name.startswith('.') and not entry.name.endswith(temp_suffix):
+                st = entry.stat()
+                current[entry.name] = [st.st_size, st.st_mtime_ns]
+
+    plan = SyncPlan()
+
+    # files sync put there that are still as it left them - anything else it put there is forgotten
+    trusted = {}
+    for name, info in list(manifest.files.items()):
+        if current.get(name) == info['stamp']:
+            trusted[name] = info
+        else:
+            if name in current and name not in desired:
+                plan.left_alone.append(name)
+            del manifest.files[name]
+
+    source_sha1s = {}
+
+    def source_sha1(source):
+        if source not in source_sha1s:
+            source_sha1s[source] = archive.file_sha1(source)
+        return source_sha1s[source]
+
+    # first pass: what's already right where it should be
+    todo = []
+    for name, source in sorted(desired.items()):
+        stamp = file_stamp(source)
+        if stamp is None:
+            plan.missing.append((name, source))
+            continue
+
+        info = trusted.get(name)
+        if info is not None and info['source'] == [source] + stamp:
+            plan.unchanged += 1
+            continue
+
+        sha1 = source_sha1(source)
+        if info is not None and info['sha1'] == sha1:
+            # the repository file was touched but its content is the same
+            info['source'] = [source] + stamp
+            plan.unchanged += 1
+        elif info is None and name in current and current[name][0] == stamp[0] and archive.file_sha1(
+                os.path.join(target_dir, name)) == sha1:
+            plan.adopted.append((name, source, sha1))
+        else:
+            todo.append((name, source, sha1))
+
+    # trusted files that aren't staying where they are can be renamed to where their content is wanted
+    settled = set(desired.keys()) - set(name for name, source, sha1 in todo)
+    spare = {}
+    for name, info in sorted(trusted.items()):
+        if name not in settled:
+            spare.setdefault(info['sha1'], []).append(name)
+
+    for name, source, sha1 in todo:
+        if len(spare.get(sha1, [])) > 0:
+            plan.renames.append((spare[sha1].pop(0), name, source))
+        else:
+            plan.copies.append((name, source, sha1))
+
+    renamed = set(old for old, new, source in plan.renames)
+    for names in spare.values():
+        for name in names:
+            if name not in renamed and name not in desired:
+                plan.deletes.append(name)
+    return plan
+
+
+def copy_and_verify(source, target, sha1):
+    # never hard linked, the copy on the device mustn't change with the repository
+    file_transfer.transfer_file(source, target, sha1, hardlink=False)
+    return file_stamp(target)
+
+
+def apply_sync(plan, target_dir, manifest, workers=None, report=print):
+    #
+    # Carry out a plan, keeping the manifest up to date as it goes.  Renames go through temp names first so that
+    # files can swap names, then the deletes, then the copies (workers at a time).  Returns the number of copies
+    # that failed.
+    #
+    def path(name):
+        return os.path.join(target_dir, name)
+
+    for name, source, sha1 in plan.adopted:
+        manifest.files[name] = {'stamp': file_stamp(path(name)), 'sha1': sha1, 'source': [source] + file_stamp(source)}
+        report(f"keep {name}")
+
+    moving = []
+    for old, new, source in plan.renames:
+        moving.append(manifest.files.pop(old))
+        os.replace(path(old), path(new) + temp_suffix)
+
+    for name in plan.deletes:
+        os.remove(path(name))
+        manifest.files.pop(name, None)
+        report(f"delete {name}")
+
+    for (old, new, source), info in zip(plan.renames, moving):
+        os.replace(path(new) + temp_suffix, path(new))
+        info['stamp'] = file_stamp(path(new))
+        info['source'] = [source] + file_stamp(source)
+        manifest.files[new] = info
+        report(f"rename {old} -> {new}")
+
+    failed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(copy_and_verify, source, path(name), sha1): (name, source, sha1)
+                   for name, source, sha1 in plan.copies}
+        for future in concurrent.futures.as_completed(futures):
+            name, source, sha1 = futures[future]
+            try:
+                stamp = future.result()
+            except Exception as errmsg:
+                failed += 1
+                report(f"FAILURE: {name} not copied: {str(errmsg)}")
+                continue
+
+            manifest.files[name] = {'stamp': stamp, 'sha1': sha1, 'source': [source] + file_stamp(source)}
+            report(f"copy {name}")
+    return failed
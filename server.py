@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import signal
+import socket
+import threading
+import socketserver
+
+#
+# A small daemon that keeps a loaded DB resident and answers queries over a Unix domain socket.
+#
+# The protocol is JSON lines.  Each request is one line:
+#
+#     {"cmd": "rom_file", "args": ["astrosmash"]}
+#
+# and gets exactly one line back, either {"ok": true, "result": ...} or {"ok": false, "error": "..."}.  A connection
+# can carry any number of requests.
+#
+# The server knows nothing about the DB itself.  It is handed a function that loads one, the file to watch, and
+# queries are run with the loaded object's query(cmd, args) method by a QueryRunner (which "inty query --stdin" uses
+# directly).
+#
+
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+
+            try:
+                req = json.loads(line)
+                result = self.server.runner.run_query(req['cmd'], req.get('args', []))
+                resp = {'ok': True, 'result': result}
+            except Exception as errmsg:
+                resp = {'ok': False, 'error': str(errmsg)}
+
+            self.wfile.write(json.dumps(resp).encode('utf-8') + b'\n')
+            self.wfile.flush()
+        return
+
+
+class QueryRunner:
+    # Runs queries against a loaded DB, reloading it first whenever the watched file has changed.  Safe to share
+    # between threads.
+    def __init__(self, load_db, watch_file):
+        self.load_db = load_db
+        self.watch_file = watch_file
+        self.lock = threading.Lock()
+        self.db = None
+        self.db_stamp = None
+        return
+
+    def file_stamp(self):
+        try:
+            st = os.stat(self.watch_file)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def run_query(self, cmd, args):
+        with self.lock:
+            # pick up any change to the data file before answering
+            stamp = self.file_stamp()
+            if self.db is None or stamp != self.db_stamp:
+                self.db = self.load_db()
+                self.db_stamp = stamp
+
+            if cmd == 'ping':
+                return 'pong'
+            return self.db.query(cmd, args)
+
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, load_db, watch_file):
+        self.runner = QueryRunner(load_db, watch_file)
+        super().__init__(socket_path, QueryHandler)
+        return
+
+
+def serve(socket_path, load_db, watch_file):
+    if os.path.exists(socket_path):
+        # a socket file nobody is listening on is left over from a daemon that died - anything else is in use
+        try:
+            send_query(socket_path, 'ping')
+        except OSError:
+            os.remove(socket_path)
+        else:
+            raise Exception(f"A server is already running on {socket_path}")
+
+    server = QueryServer(socket_path, load_db, watch_file)
+
+    # being stopped should still clean up the socket file
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        # load up front so the first query doesn't pay for it
+        server.runner.run_query('ping', [])
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+    return
+
+
+def send_query(socket_path, cmd, args=(), timeout=10.0):
+    #
+    # Send one query to a running server and return its result.  Raises OSError if there's no server to talk to
+    # (so callers can fall back to doing the work themselves) and Exception with the server's message if the query
+    # itself failed.
+    #
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps({'cmd': cmd, 'args': list(args)}).encode('utf-8') + b'\n')
+
+        with sock.makefile('rb') as fh:
+            line = fh.readline()
+
+    if not line:
+        raise ConnectionError(f"No response from server on {socket_path}")
+
+    resp = json.loads(line)
+    if resp['ok'] is not True:
+        raise Exception(resp['error'])
+    return resp['result']